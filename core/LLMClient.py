@@ -51,6 +51,7 @@ class LLMClient:
         image_paths: Optional[list[str]] = None,
         temperature: float = 0.7,
         max_tokens: int = 8192,
+        stream: bool = False,
     ) -> str:
         """
         Create chat completion (supports multimodal).
@@ -61,6 +62,7 @@ class LLMClient:
             image_paths: List of image paths (optional)
             temperature: Generation temperature
             max_tokens: Maximum number of tokens
+            stream: Receive the response incrementally (optional)
 
         Returns:
             str: Model generated response content
@@ -71,4 +73,41 @@ class LLMClient:
             image_paths=image_paths,
             temperature=temperature,
             max_tokens=max_tokens,
+            stream=stream,
         )
+
+    async def acompletion(
+        self,
+        user_message: str,
+        system_prompt: Optional[str] = None,
+        image_paths: Optional[list[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 8192,
+        stream: bool = False,
+    ) -> str:
+        """
+        Create chat completion asynchronously (supports multimodal).
+
+        Args:
+            user_message: User message content
+            system_prompt: System prompt (optional)
+            image_paths: List of image paths (optional)
+            temperature: Generation temperature
+            max_tokens: Maximum number of tokens
+            stream: Receive the response incrementally (optional)
+
+        Returns:
+            str: Model generated response content
+        """
+        return await self._provider.acompletion(
+            user_message=user_message,
+            system_prompt=system_prompt,
+            image_paths=image_paths,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream,
+        )
+
+    async def aclose(self):
+        """Release the provider's resources for the running event loop."""
+        await self._provider.aclose()
@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "markpdfdown", "responses.sqlite"
+)
+
+
+def make_cache_key(*parts, image_paths: Optional[list[str]] = None) -> str:
+    """
+    Build a cache key from request parameters and image file contents
+
+    Args:
+        *parts: Request parameters (provider, model, prompts, ...)
+        image_paths: Optional list of image paths whose content is hashed
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    for image_path in image_paths or []:
+        with open(image_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite-backed cache of LLM responses
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        """
+        Initialize ResponseCache
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT)"
+            )
+        logger.info("Using response cache at %s", path)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            Optional[str]: Cached response, or None on a miss
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        """
+        Store a response
+
+        Args:
+            key (str): Cache key
+            value (str): Response to store
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
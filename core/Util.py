@@ -1,3 +1,6 @@
+import os
+
+
 def remove_markdown_warp(text, language="markdown"):
     """
     Remove the warp of ```language and ```
@@ -8,3 +11,24 @@ def remove_markdown_warp(text, language="markdown"):
     if text.endswith("```"):
         text = text[: -len("```")]
     return text.strip()
+
+
+def prefetch_files(paths):
+    """
+    Hint the kernel to start reading files into the page cache
+    (posix_fadvise WILLNEED), so later reads do not block on disk.
+    No-op on platforms without posix_fadvise.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
@@ -1,14 +1,36 @@
+import functools
+import os
+
 from .base import BaseProvider
 from .gemini_provider import GeminiProvider
-from .openai_provider import OpenAIProvider
+from .openai_provider import OpenAIProvider, _shared_http_client
+
+__all__ = [
+    "BaseProvider",
+    "OpenAIProvider",
+    "GeminiProvider",
+    "create_provider",
+    "reset_providers",
+]
 
-__all__ = ["BaseProvider", "OpenAIProvider", "GeminiProvider", "create_provider"]
+# Factories by provider name; OpenAI-compatible providers are configured by
+# name so the memoized instance always matches its cache key
+_PROVIDERS = {
+    "openai": functools.partial(OpenAIProvider, "openai"),
+    "deepseek": functools.partial(OpenAIProvider, "deepseek"),  # OpenAI-compatible API
+    "gemini": GeminiProvider,
+}
 
 
 def create_provider(provider_name: str = None) -> BaseProvider:
     """
     Create a provider instance based on the provider name.
 
+    Providers are created once per name and reused, so the underlying SDK
+    client and its connection pool are initialized only once per process.
+    Call reset_providers() to force re-creation, e.g. after changing the
+    environment.
+
     Args:
         provider_name: Provider name ("openai", "gemini", "deepseek").
                       If None, uses LLM_PROVIDER env var or defaults to "openai".
@@ -16,23 +38,34 @@ def create_provider(provider_name: str = None) -> BaseProvider:
     Returns:
         BaseProvider: Provider instance
     """
-    import os
-
     if provider_name is None:
         provider_name = os.getenv("LLM_PROVIDER", "openai").lower()
     else:
         provider_name = provider_name.lower()
 
-    providers = {
-        "openai": OpenAIProvider,
-        "deepseek": OpenAIProvider,  # DeepSeek uses OpenAI-compatible API
-        "gemini": GeminiProvider,
-    }
-
-    if provider_name not in providers:
+    if provider_name not in _PROVIDERS:
         raise ValueError(
             f"Unknown provider: {provider_name}. "
-            f"Supported providers: {list(providers.keys())}"
+            f"Supported providers: {list(_PROVIDERS.keys())}"
         )
 
-    return providers[provider_name]()
+    return _get_provider(provider_name)
+
+
+@functools.cache
+def _get_provider(provider_name: str) -> BaseProvider:
+    """Instantiate a provider by normalized name (memoized)."""
+    return _PROVIDERS[provider_name]()
+
+
+def reset_providers():
+    """
+    Drop the memoized providers and close the shared HTTP client.
+
+    The next create_provider() call builds a new provider from the current
+    environment.
+    """
+    _get_provider.cache_clear()
+    if _shared_http_client.cache_info().currsize:
+        _shared_http_client().close()
+    _shared_http_client.cache_clear()
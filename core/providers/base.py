@@ -1,10 +1,74 @@
-import base64
+import asyncio
+import functools
 import logging
+import os
 from abc import ABC, abstractmethod
+from io import BytesIO
+from pathlib import Path
 from typing import Optional
 
+from PIL import Image
+
+# Use the SIMD-accelerated pybase64 when available
+try:
+    import pybase64 as _b64
+except ImportError:
+    import base64 as _b64
+
 logger = logging.getLogger(__name__)
 
+# Image MIME types by file extension
+_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".bmp": "image/bmp",
+}
+
+
+@functools.lru_cache(maxsize=64)
+def _prepare_image_for_vision(
+    image_path: str, mtime: float, max_size: int
+) -> tuple[bytes, str]:
+    """
+    Downscale an image and re-encode it as WebP to shrink the request payload.
+
+    The original bytes are kept when re-encoding is disabled, the image
+    cannot be decoded, or re-encoding does not make it smaller. Cached by
+    path, modification time and size limit.
+
+    Args:
+        image_path: Path to the image file
+        mtime: Modification time of the image file
+        max_size: Maximum length in pixels of the longer side, 0 to disable
+
+    Returns:
+        tuple[bytes, str]: Image data and its MIME type
+    """
+    data = Path(image_path).read_bytes()
+    mime_type = BaseProvider.get_image_mime_type(image_path)
+
+    if max_size <= 0:
+        return data, mime_type
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.thumbnail((max_size, max_size))
+            if img.mode not in ("RGB", "RGBA", "L"):
+                img = img.convert("RGB")
+            buffer = BytesIO()
+            img.save(buffer, "WEBP", quality=80, method=4)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Image re-encoding failed, sending original: {e}")
+        return data, mime_type
+
+    webp_data = buffer.getvalue()
+    if len(webp_data) >= len(data):
+        return data, mime_type
+    return webp_data, "image/webp"
+
 
 class BaseProvider(ABC):
     """
@@ -12,6 +76,9 @@ class BaseProvider(ABC):
     All providers must implement the completion method.
     """
 
+    # Number of times the provider itself retries a failed HTTP request
+    max_retries = 0
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -26,6 +93,7 @@ class BaseProvider(ABC):
         image_paths: Optional[list[str]] = None,
         temperature: float = 0.7,
         max_tokens: int = 8192,
+        stream: bool = False,
     ) -> str:
         """
         Generate a completion from the LLM.
@@ -36,13 +104,59 @@ class BaseProvider(ABC):
             image_paths: Optional list of image file paths for multimodal input
             temperature: Sampling temperature (0.0 to 1.0)
             max_tokens: Maximum tokens in the response
+            stream: Receive the response incrementally instead of in one piece
 
         Returns:
             str: The generated text response
         """
         pass
 
-    def encode_image_to_base64(self, image_path: str) -> str:
+    async def acompletion(
+        self,
+        user_message: str,
+        system_prompt: Optional[str] = None,
+        image_paths: Optional[list[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 8192,
+        stream: bool = False,
+    ) -> str:
+        """
+        Generate a completion from the LLM asynchronously.
+
+        Providers with a native async client should override this; the
+        default runs completion() in a worker thread.
+
+        Args:
+            user_message: The user's message/prompt
+            system_prompt: Optional system prompt
+            image_paths: Optional list of image file paths for multimodal input
+            temperature: Sampling temperature (0.0 to 1.0)
+            max_tokens: Maximum tokens in the response
+            stream: Receive the response incrementally instead of in one piece
+
+        Returns:
+            str: The generated text response
+        """
+        return await asyncio.to_thread(
+            self.completion,
+            user_message=user_message,
+            system_prompt=system_prompt,
+            image_paths=image_paths,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream,
+        )
+
+    async def aclose(self):
+        """
+        Release resources held for asynchronous requests in the running event loop.
+
+        Call this before the event loop ends; the default does nothing.
+        """
+        return None
+
+    @staticmethod
+    def encode_image_to_base64(image_path: str) -> str:
         """
         Encode an image file to base64 string.
 
@@ -52,10 +166,54 @@ class BaseProvider(ABC):
         Returns:
             str: Base64 encoded image data
         """
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode("utf-8")
+        return BaseProvider.encode_bytes_to_base64(Path(image_path).read_bytes())
+
+    @staticmethod
+    def encode_bytes_to_base64(data: bytes) -> str:
+        """
+        Encode raw bytes to base64 string.
+
+        Args:
+            data: Bytes to encode
+
+        Returns:
+            str: Base64 encoded data
+        """
+        # Base64 output is pure ASCII, which decodes faster than UTF-8
+        return _b64.b64encode(data).decode("ascii")
 
-    def get_image_mime_type(self, image_path: str) -> str:
+    @staticmethod
+    def prepare_image_for_vision(image_path: str) -> tuple[bytes, str]:
+        """
+        Load an image for a vision request, downscaled and re-encoded as WebP.
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            tuple[bytes, str]: Image data and its MIME type
+        """
+        return _prepare_image_for_vision(
+            image_path,
+            os.path.getmtime(image_path),
+            BaseProvider.get_image_max_size(),
+        )
+
+    @staticmethod
+    def get_image_max_size() -> int:
+        """
+        Get the size limit for images sent to the model.
+
+        Images are limited to MPD_IMAGE_MAX_SIZE pixels (default 2000) on
+        their longer side; 0 disables re-encoding.
+
+        Returns:
+            int: Maximum length in pixels of the longer side
+        """
+        return int(os.getenv("MPD_IMAGE_MAX_SIZE", "2000"))
+
+    @staticmethod
+    def get_image_mime_type(image_path: str) -> str:
         """
         Get the MIME type of an image based on file extension.
 
@@ -65,15 +223,5 @@ class BaseProvider(ABC):
         Returns:
             str: MIME type string
         """
-        import os
-
         ext = os.path.splitext(image_path)[1].lower()
-        mime_types = {
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".png": "image/png",
-            ".gif": "image/gif",
-            ".webp": "image/webp",
-            ".bmp": "image/bmp",
-        }
-        return mime_types.get(ext, "image/jpeg")
+        return _MIME_TYPES.get(ext, "image/jpeg")
@@ -1,11 +1,20 @@
+import asyncio
 import logging
 import os
+import threading
+import time
+import weakref
+from io import BytesIO
 from typing import Optional
 
 from .base import BaseProvider
 
 logger = logging.getLogger(__name__)
 
+# Seconds an uploaded file is reused before it is uploaded again
+# (the File API itself keeps files for 48 hours)
+_UPLOAD_TTL = 3600
+
 
 class GeminiProvider(BaseProvider):
     """
@@ -37,8 +46,21 @@ class GeminiProvider(BaseProvider):
             "OPENAI_DEFAULT_MODEL", "gemini-2.5-flash"
         )
 
-        # Initialize client
-        self.client = self._genai.Client(api_key=self.api_key)
+        # Per-request timeout in seconds
+        self.timeout = float(os.getenv("LLM_TIMEOUT", "120"))
+
+        # Images at least this many bytes are sent through the File API and
+        # referenced by URI instead of being inlined in every request
+        self.upload_threshold = int(
+            os.getenv("GEMINI_UPLOAD_THRESHOLD", str(4 * 1024 * 1024))
+        )
+        self._uploads = {}
+        self._uploads_lock = threading.Lock()
+
+        # Initialize client (async clients are created on first use in each
+        # event loop, since their connections cannot be shared across loops)
+        self.client = self._create_client()
+        self._async_clients = weakref.WeakKeyDictionary()
 
         logger.info(f"Initialized Gemini provider with model: {self.model}")
 
@@ -46,39 +68,82 @@ class GeminiProvider(BaseProvider):
     def name(self) -> str:
         return "gemini"
 
-    def completion(
-        self,
-        user_message: str,
-        system_prompt: Optional[str] = None,
-        image_paths: Optional[list[str]] = None,
-        temperature: float = 0.7,
-        max_tokens: int = 8192,
-    ) -> str:
+    @property
+    def async_client(self):
+        """Get the async client for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._create_client()
+            self._async_clients[loop] = client
+        return client.aio
+
+    async def aclose(self):
+        """Close the asynchronous client of the running event loop, if any."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aio.aclose()
+            client.close()
+
+    def _create_client(self):
+        """Create a client (HttpOptions timeout is in milliseconds)."""
+        return self._genai.Client(
+            api_key=self.api_key,
+            http_options=self._types.HttpOptions(timeout=int(self.timeout * 1000)),
+        )
+
+    def _image_part(self, img_path: str):
         """
-        Generate a completion using Google Gemini API.
+        Build the content part for an image.
+
+        Small images are inlined; large ones are uploaded once through the
+        File API and referenced on subsequent requests.
 
         Args:
-            user_message: The user's message/prompt
-            system_prompt: Optional system prompt
-            image_paths: Optional list of image file paths
-            temperature: Sampling temperature
-            max_tokens: Maximum tokens in response
+            img_path: Path to the image file
 
         Returns:
-            str: Generated text response
+            Content part (inline Part or uploaded File)
         """
+        image_bytes, mime_type = self.prepare_image_for_vision(img_path)
+        if len(image_bytes) < self.upload_threshold:
+            return self._types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+
+        key = (img_path, os.path.getmtime(img_path), self.get_image_max_size())
+        now = time.monotonic()
+        with self._uploads_lock:
+            self._uploads = {
+                k: v for k, v in self._uploads.items() if now - v[1] < _UPLOAD_TTL
+            }
+            cached = self._uploads.get(key)
+        if cached is not None:
+            return cached[0]
+
+        uploaded = self.client.files.upload(
+            file=BytesIO(image_bytes),
+            config=self._types.UploadFileConfig(mime_type=mime_type),
+        )
+        logger.info(f"Uploaded {img_path} to Gemini File API")
+        with self._uploads_lock:
+            self._uploads[key] = (uploaded, now)
+        return uploaded
+
+    def _build_request(
+        self,
+        user_message: str,
+        system_prompt: Optional[str],
+        image_paths: Optional[list[str]],
+        temperature: float,
+        max_tokens: int,
+    ) -> dict:
+        """Build the generate_content keyword arguments."""
         # Build content parts
         contents = []
 
         # Add images first (if any)
         if image_paths:
             for img_path in image_paths:
-                with open(img_path, "rb") as f:
-                    image_bytes = f.read()
-                mime_type = self.get_image_mime_type(img_path)
-                contents.append(
-                    self._types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
-                )
+                contents.append(self._image_part(img_path))
 
         # Add text message
         contents.append(user_message)
@@ -93,12 +158,91 @@ class GeminiProvider(BaseProvider):
         if system_prompt:
             generation_config.system_instruction = system_prompt
 
+        return {"model": self.model, "contents": contents, "config": generation_config}
+
+    def completion(
+        self,
+        user_message: str,
+        system_prompt: Optional[str] = None,
+        image_paths: Optional[list[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 8192,
+        stream: bool = False,
+    ) -> str:
+        """
+        Generate a completion using Google Gemini API.
+
+        Args:
+            user_message: The user's message/prompt
+            system_prompt: Optional system prompt
+            image_paths: Optional list of image file paths
+            temperature: Sampling temperature
+            max_tokens: Maximum tokens in response
+            stream: Stream the response
+
+        Returns:
+            str: Generated text response
+        """
+        request = self._build_request(
+            user_message, system_prompt, image_paths, temperature, max_tokens
+        )
+
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=generation_config,
-            )
+            if stream:
+                response = self.client.models.generate_content_stream(**request)
+                return "".join(chunk.text or "" for chunk in response)
+
+            response = self.client.models.generate_content(**request)
+            return response.text
+
+        except Exception as e:
+            logger.error(f"Gemini API request failed: {e}")
+            raise
+
+    async def acompletion(
+        self,
+        user_message: str,
+        system_prompt: Optional[str] = None,
+        image_paths: Optional[list[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 8192,
+        stream: bool = False,
+    ) -> str:
+        """
+        Generate a completion using the asynchronous Google Gemini API.
+
+        Args:
+            user_message: The user's message/prompt
+            system_prompt: Optional system prompt
+            image_paths: Optional list of image file paths
+            temperature: Sampling temperature
+            max_tokens: Maximum tokens in response
+            stream: Stream the response
+
+        Returns:
+            str: Generated text response
+        """
+        # Image loading and re-encoding is blocking work; keep it off the event loop
+        request = await asyncio.to_thread(
+            self._build_request,
+            user_message,
+            system_prompt,
+            image_paths,
+            temperature,
+            max_tokens,
+        )
+
+        try:
+            if stream:
+                response = await self.async_client.models.generate_content_stream(
+                    **request
+                )
+                parts = []
+                async for chunk in response:
+                    parts.append(chunk.text or "")
+                return "".join(parts)
+
+            response = await self.async_client.models.generate_content(**request)
             return response.text
 
         except Exception as e:
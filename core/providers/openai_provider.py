@@ -1,13 +1,51 @@
+import asyncio
+import functools
 import logging
 import os
+import weakref
 from typing import Optional
 
+import httpx
 import openai
 
 from .base import BaseProvider
 
 logger = logging.getLogger(__name__)
 
+# Connection pool limits; with HTTP/2, concurrent requests are multiplexed over
+# a few kept-alive TLS connections instead of opening one connection each
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+
+@functools.cache
+def _shared_http_client() -> httpx.Client:
+    """
+    Get the process-wide HTTP/2 client.
+
+    Every OpenAI-compatible provider sends its requests through this one
+    connection pool, so TCP/TLS setup is paid once per host per process.
+    Timeouts are passed per request by the OpenAI SDK.
+
+    Returns:
+        httpx.Client: Shared HTTP client
+    """
+    return httpx.Client(http2=True, limits=_HTTP_LIMITS)
+
+
+def _data_url_for(image_path: str) -> str:
+    """
+    Build a base64 data URL for an image.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        str: Data URL containing the encoded image
+    """
+    image_data, mime_type = BaseProvider.prepare_image_for_vision(image_path)
+    base64_image = BaseProvider.encode_bytes_to_base64(image_data)
+    return f"data:{mime_type};base64,{base64_image}"
+
 
 class OpenAIProvider(BaseProvider):
     """
@@ -29,9 +67,17 @@ class OpenAIProvider(BaseProvider):
         },
     }
 
-    def __init__(self):
-        """Initialize the OpenAI-compatible provider."""
-        self._provider_type = os.getenv("LLM_PROVIDER", "openai").lower()
+    def __init__(self, provider_type: Optional[str] = None):
+        """
+        Initialize the OpenAI-compatible provider.
+
+        Args:
+            provider_type: Service to configure ("openai", "deepseek").
+                          If None, uses LLM_PROVIDER env var or defaults to "openai".
+        """
+        self._provider_type = (
+            provider_type or os.getenv("LLM_PROVIDER", "openai")
+        ).lower()
         if self._provider_type not in self.PROVIDER_CONFIGS:
             self._provider_type = "openai"
 
@@ -50,8 +96,20 @@ class OpenAIProvider(BaseProvider):
         # Get model (allow override via environment variable)
         self.model = os.getenv("OPENAI_DEFAULT_MODEL") or config["default_model"]
 
-        # Initialize client
-        self.client = openai.OpenAI(base_url=self.base_url, api_key=self.api_key)
+        # Stream responses by default when OPENAI_STREAM=1
+        self.stream = os.getenv("OPENAI_STREAM", "0") == "1"
+
+        # Per-request timeout and retry budget; the SDK retries timeouts, rate
+        # limits and server errors with exponential backoff and jitter
+        self.timeout = float(os.getenv("LLM_TIMEOUT", "120"))
+        self.max_retries = int(os.getenv("LLM_RETRIES", "3"))
+
+        # Initialize client (async clients are created on first use in each
+        # event loop, since their connections cannot be shared across loops)
+        self.client = openai.OpenAI(
+            **self._client_kwargs(), http_client=_shared_http_client()
+        )
+        self._async_clients = weakref.WeakKeyDictionary()
 
         logger.info(
             f"Initialized {self._provider_type} provider with model: {self.model}"
@@ -61,6 +119,77 @@ class OpenAIProvider(BaseProvider):
     def name(self) -> str:
         return self._provider_type
 
+    @property
+    def async_client(self) -> "openai.AsyncOpenAI":
+        """Get the async client for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                **self._client_kwargs(),
+                http_client=httpx.AsyncClient(
+                    http2=True, limits=_HTTP_LIMITS, timeout=self._http_timeout()
+                ),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """Close the asynchronous client of the running event loop, if any."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def _http_timeout(self) -> httpx.Timeout:
+        """Build the request timeout (LLM_TIMEOUT, 5 second connect timeout)."""
+        return httpx.Timeout(self.timeout, connect=5.0)
+
+    def _client_kwargs(self) -> dict:
+        """Build the keyword arguments shared by the sync and async clients."""
+        return {
+            "base_url": self.base_url,
+            "api_key": self.api_key,
+            "timeout": self._http_timeout(),
+            "max_retries": self.max_retries,
+        }
+
+    def _build_request(
+        self,
+        user_message: str,
+        system_prompt: Optional[str],
+        image_paths: Optional[list[str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool,
+    ) -> dict:
+        """Build the chat.completions.create keyword arguments."""
+        # Build user content with text and optional images (size is known
+        # up front, so fill a preallocated list instead of appending)
+        image_paths = image_paths or []
+        user_content = [None] * (1 + len(image_paths))
+        user_content[0] = {"type": "text", "text": user_message}
+        for i, img_path in enumerate(image_paths, 1):
+            data_url = _data_url_for(img_path)
+            user_content[i] = {"type": "image_url", "image_url": {"url": data_url}}
+
+        # Build messages
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": user_content})
+
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": stream,
+            "extra_headers": {
+                "X-Title": "MarkPDFdown",
+                "HTTP-Referer": "https://github.com/MarkPDFdown/markpdfdown.git",
+            },
+        }
+
     def completion(
         self,
         user_message: str,
@@ -68,6 +197,7 @@ class OpenAIProvider(BaseProvider):
         image_paths: Optional[list[str]] = None,
         temperature: float = 0.7,
         max_tokens: int = 8192,
+        stream: bool = False,
     ) -> str:
         """
         Generate a completion using OpenAI-compatible API.
@@ -78,41 +208,73 @@ class OpenAIProvider(BaseProvider):
             image_paths: Optional list of image file paths
             temperature: Sampling temperature
             max_tokens: Maximum tokens in response
+            stream: Stream the response (also enabled by OPENAI_STREAM=1)
 
         Returns:
             str: Generated text response
         """
-        # Build user content with text and optional images
-        user_content = [{"type": "text", "text": user_message}]
-
-        if image_paths:
-            for img_path in image_paths:
-                base64_image = self.encode_image_to_base64(img_path)
-                mime_type = self.get_image_mime_type(img_path)
-                user_content.append(
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:{mime_type};base64,{base64_image}"},
-                    }
+        stream = stream or self.stream
+        request = self._build_request(
+            user_message, system_prompt, image_paths, temperature, max_tokens, stream
+        )
+
+        try:
+            response = self.client.chat.completions.create(**request)
+            if stream:
+                return "".join(
+                    chunk.choices[0].delta.content or ""
+                    for chunk in response
+                    if chunk.choices
                 )
+            return response.choices[0].message.content
 
-        # Build messages
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": user_content})
+        except Exception as e:
+            logger.error(f"API request failed: {e}")
+            raise
+
+    async def acompletion(
+        self,
+        user_message: str,
+        system_prompt: Optional[str] = None,
+        image_paths: Optional[list[str]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 8192,
+        stream: bool = False,
+    ) -> str:
+        """
+        Generate a completion using the asynchronous OpenAI-compatible client.
+
+        Args:
+            user_message: The user's message/prompt
+            system_prompt: Optional system prompt
+            image_paths: Optional list of image file paths
+            temperature: Sampling temperature
+            max_tokens: Maximum tokens in response
+            stream: Stream the response (also enabled by OPENAI_STREAM=1)
+
+        Returns:
+            str: Generated text response
+        """
+        stream = stream or self.stream
+        # Image loading and re-encoding is blocking work; keep it off the event loop
+        request = await asyncio.to_thread(
+            self._build_request,
+            user_message,
+            system_prompt,
+            image_paths,
+            temperature,
+            max_tokens,
+            stream,
+        )
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                extra_headers={
-                    "X-Title": "MarkPDFdown",
-                    "HTTP-Referer": "https://github.com/MarkPDFdown/markpdfdown.git",
-                },
-            )
+            response = await self.async_client.chat.completions.create(**request)
+            if stream:
+                parts = []
+                async for chunk in response:
+                    if chunk.choices:
+                        parts.append(chunk.choices[0].delta.content or "")
+                return "".join(parts)
             return response.choices[0].message.content
 
         except Exception as e:
@@ -1,14 +1,19 @@
+import asyncio
 import logging
 import os
 import shutil
+import sqlite3
 import sys
+import threading
 import time
 
 from dotenv import load_dotenv
 
 from core.FileWorker import create_worker
 from core.LLMClient import LLMClient
-from core.Util import remove_markdown_warp
+from core.providers import BaseProvider
+from core.ResponseCache import DEFAULT_CACHE_PATH, ResponseCache, make_cache_key
+from core.Util import prefetch_files, remove_markdown_warp
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,8 +24,48 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Separator the model is asked to emit between pages of a batched request
+PAGE_BREAK = "<<<PAGE_BREAK>>>"
+
+# Magic numbers/signatures used to detect the input type: (prefix, extension, label)
+FILE_SIGNATURES = (
+    (b"%PDF-", ".pdf", "PDF"),
+    (b"\xff\xd8\xff\xdb", ".jpeg", "JPEG"),
+    (b"\xff\xd8\xff\xe0", ".jpg", "JPG"),
+    (b"\x89\x50\x4e\x47", ".png", "PNG"),
+    (b"\x42\x4d", ".bmp", "BMP"),
+)
+
+# Prompts for converting a single page
+_SYSTEM_PROMPT = """
+You are a helpful assistant that can convert images to Markdown format. You are given an image, and you need to convert it to Markdown format. Please output the Markdown content only, without any other text.
+"""
+_USER_PROMPT = """
+Below is the image of one page of a document, please read the content in the image and transcribe it into plain Markdown format. Please note:
+1. Identify heading levels, text styles, formulas, and the format of table rows and columns
+2. Mathematical formulas should be transcribed using LaTeX syntax, ensuring consistency with the original
+3. Please output the Markdown content only, without any other text.
+"""
+
+# Prompts for converting several pages in one request; the user prompt is
+# formatted with the number of pages in the batch
+_BATCH_SYSTEM_PROMPT = f"""
+You are a helpful assistant that can convert images to Markdown format. You are given several images, each one page of a document, and you need to convert each of them to Markdown format. Please output the Markdown content only, without any other text, and separate the pages with a line containing only {PAGE_BREAK}.
+"""
+_BATCH_USER_PROMPT = f"""
+Below are the images of {{page_count}} consecutive pages of a document, please read the content in each image and transcribe it into plain Markdown format. Please note:
+1. Identify heading levels, text styles, formulas, and the format of table rows and columns
+2. Mathematical formulas should be transcribed using LaTeX syntax, ensuring consistency with the original
+3. Transcribe the pages in the order the images are given, and separate consecutive pages with a line containing only {PAGE_BREAK}
+4. Please output the Markdown content only, without any other text.
+"""
+
 # Global LLM client instance (initialized once)
 _llm_client = None
+_llm_client_lock = threading.Lock()
+
+# On-disk cache of LLM responses (enabled by the CLI unless MPD_CACHE=0)
+_response_cache = None
 
 
 def get_llm_client() -> LLMClient:
@@ -38,19 +83,123 @@ def get_llm_client() -> LLMClient:
     """
     global _llm_client
     if _llm_client is None:
-        provider_name = os.getenv("LLM_PROVIDER", "openai").lower()
-        logger.info(f"Initializing LLM client with provider: {provider_name}")
-        _llm_client = LLMClient(provider_name=provider_name)
+        with _llm_client_lock:
+            if _llm_client is None:
+                provider_name = os.getenv("LLM_PROVIDER", "openai").lower()
+                logger.info(f"Initializing LLM client with provider: {provider_name}")
+                _llm_client = LLMClient(provider_name=provider_name)
     return _llm_client
 
 
+def detect_file_type(data):
+    """
+    Detect the file type from its leading bytes
+    Args:
+        data (bytes): File content, or at least its first bytes
+    Returns:
+        str: File extension (e.g. ".pdf"), or None if unsupported
+    """
+    for signature, ext, label in FILE_SIGNATURES:
+        if data.startswith(signature):
+            logger.info(f"Recognized as {label} file by file content")
+            return ext
+    return None
+
+
+def get_max_concurrency() -> int:
+    """
+    Get the number of LLM requests allowed in flight at once.
+    Uses MPD_CONCURRENCY (default 8), capped at LLM_RPM / 60 when set.
+
+    Returns:
+        int: Maximum number of concurrent LLM requests
+    """
+    max_concurrency = int(os.getenv("MPD_CONCURRENCY", "8"))
+    rpm = int(os.getenv("LLM_RPM", "0"))
+    if rpm:
+        max_concurrency = min(max_concurrency, rpm // 60)
+    return max(1, max_concurrency)
+
+
+def enable_response_cache(path=None):
+    """
+    Enable the on-disk LLM response cache.
+    Conversion continues without the cache if it cannot be opened.
+
+    Args:
+        path (str, optional): Cache database path, defaults to MPD_CACHE_PATH or ~/.cache/markpdfdown/responses.sqlite
+
+    Returns:
+        ResponseCache: The enabled cache, or None if it could not be opened
+    """
+    global _response_cache
+    if path is None:
+        path = os.getenv("MPD_CACHE_PATH") or DEFAULT_CACHE_PATH
+    try:
+        _response_cache = ResponseCache(path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Response cache unavailable, continuing without it: {e}")
+        _response_cache = None
+    return _response_cache
+
+
+def _lookup_response_cache(
+    client, message, system_prompt, image_paths, temperature, max_tokens
+):
+    """
+    Look up a request in the response cache
+    Returns:
+        tuple: (cache key or None if caching is disabled, cached response or None)
+    """
+    if _response_cache is None:
+        return None, None
+    try:
+        cache_key = make_cache_key(
+            client.provider.name,
+            getattr(client.provider, "model", ""),
+            system_prompt,
+            message,
+            temperature,
+            max_tokens,
+            BaseProvider.get_image_max_size(),
+            image_paths=image_paths,
+        )
+        cached = _response_cache.get(cache_key)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Response cache lookup failed, skipping the cache: {e}")
+        return None, None
+    if cached is not None:
+        logger.info("Using cached LLM response")
+    return cache_key, cached
+
+
+def _store_response_cache(cache_key, response):
+    """
+    Store a response in the response cache
+    A failed write is logged and otherwise ignored, so the response is kept
+    """
+    try:
+        _response_cache.set(cache_key, response)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Response cache write failed: {e}")
+
+
+def _default_retry_times(client) -> int:
+    """
+    Get the number of attempts for an LLM call.
+    Providers that already retry failed HTTP requests get a single attempt,
+    so the two retry layers do not multiply.
+    """
+    return 1 if client.provider.max_retries else 3
+
+
 def completion(
     message,
     system_prompt="",
     image_paths=None,
     temperature=0.5,
     max_tokens=8192,
-    retry_times=3,
+    retry_times=None,
 ):
     """
     Call LLM completion interface for text generation.
@@ -61,14 +210,24 @@ def completion(
         image_paths (List[str], optional): List of image paths, defaults to None
         temperature (float, optional): Temperature for text generation, defaults to 0.5
         max_tokens (int, optional): Maximum number of tokens for generated text, defaults to 8192
-        retry_times (int, optional): Number of retry attempts, defaults to 3
+        retry_times (int, optional): Number of attempts, defaults to 1 if the provider retries requests itself, otherwise 3
 
     Returns:
         str: Generated text content
     """
     client = get_llm_client()
 
-    # Call completion method with retry mechanism
+    # Serve repeated requests from the response cache
+    cache_key, cached = _lookup_response_cache(
+        client, message, system_prompt, image_paths, temperature, max_tokens
+    )
+    if cached is not None:
+        return cached
+
+    # Call completion method with retry mechanism (for providers without
+    # HTTP-level retries of their own)
+    if retry_times is None:
+        retry_times = _default_retry_times(client)
     for attempt in range(retry_times):
         try:
             response = client.completion(
@@ -78,11 +237,74 @@ def completion(
                 temperature=temperature,
                 max_tokens=max_tokens,
             )
-            return response
         except Exception as e:
             logger.error(f"LLM call failed (attempt {attempt + 1}/{retry_times}): {e}")
             if attempt < retry_times - 1:
                 time.sleep(0.5 * (attempt + 1))  # Exponential backoff
+            continue
+        if cache_key is not None and response:
+            _store_response_cache(cache_key, response)
+        return response
+    return ""
+
+
+async def acompletion(
+    message,
+    system_prompt="",
+    image_paths=None,
+    temperature=0.5,
+    max_tokens=8192,
+    retry_times=None,
+):
+    """
+    Asynchronous version of completion().
+
+    Args:
+        message (str): User input message
+        system_prompt (str, optional): System prompt, defaults to empty string
+        image_paths (List[str], optional): List of image paths, defaults to None
+        temperature (float, optional): Temperature for text generation, defaults to 0.5
+        max_tokens (int, optional): Maximum number of tokens for generated text, defaults to 8192
+        retry_times (int, optional): Number of attempts, defaults to 1 if the provider retries requests itself, otherwise 3
+
+    Returns:
+        str: Generated text content
+    """
+    client = get_llm_client()
+
+    # Serve repeated requests from the response cache (hashing the images and
+    # querying SQLite are blocking, so keep them off the event loop)
+    cache_key, cached = await asyncio.to_thread(
+        _lookup_response_cache,
+        client,
+        message,
+        system_prompt,
+        image_paths,
+        temperature,
+        max_tokens,
+    )
+    if cached is not None:
+        return cached
+
+    if retry_times is None:
+        retry_times = _default_retry_times(client)
+    for attempt in range(retry_times):
+        try:
+            response = await client.acompletion(
+                user_message=message,
+                system_prompt=system_prompt,
+                image_paths=image_paths,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        except Exception as e:
+            logger.error(f"LLM call failed (attempt {attempt + 1}/{retry_times}): {e}")
+            if attempt < retry_times - 1:
+                await asyncio.sleep(0.5 * (attempt + 1))
+            continue
+        if cache_key is not None and response:
+            await asyncio.to_thread(_store_response_cache, cache_key, response)
+        return response
     return ""
 
 
@@ -94,24 +316,9 @@ def convert_image_to_markdown(image_path):
     Returns:
         str: Converted Markdown string
     """
-    system_prompt = """
-You are a helpful assistant that can convert images to Markdown format. You are given an image, and you need to convert it to Markdown format. Please output the Markdown content only, without any other text.
-"""
-    user_prompt = """
-Below is the image of one page of a document, please read the content in the image and transcribe it into plain Markdown format. Please note:
-1. Identify heading levels, text styles, formulas, and the format of table rows and columns
-2. Mathematical formulas should be transcribed using LaTeX syntax, ensuring consistency with the original
-3. Please output the Markdown content only, without any other text.
-
-Output Example:
-```markdown
-{example}
-```
-"""
-
     response = completion(
-        message=user_prompt,
-        system_prompt=system_prompt,
+        message=_USER_PROMPT,
+        system_prompt=_SYSTEM_PROMPT,
         image_paths=[image_path],
         temperature=0.3,
         max_tokens=8192,
@@ -120,6 +327,123 @@ Output Example:
     return response
 
 
+async def aconvert_image_to_markdown(image_path):
+    """
+    Asynchronously convert image to Markdown format
+    Args:
+        image_path (str): Path to the image
+    Returns:
+        str: Converted Markdown string
+    """
+    logger.info("Converting image %s to Markdown", image_path)
+    response = await acompletion(
+        message=_USER_PROMPT,
+        system_prompt=_SYSTEM_PROMPT,
+        image_paths=[image_path],
+        temperature=0.3,
+        max_tokens=8192,
+    )
+    return remove_markdown_warp(response, "markdown")
+
+
+async def aconvert_batch_to_markdown(image_paths):
+    """
+    Convert several images to Markdown with a single LLM request
+    Args:
+        image_paths (List[str]): Paths to the images, in page order
+    Returns:
+        List[str]: Converted Markdown strings, one per image
+    """
+    if len(image_paths) == 1:
+        return [await aconvert_image_to_markdown(image_paths[0])]
+
+    logger.info("Converting images %s to Markdown", ", ".join(image_paths))
+    # Budget 8192 tokens per page, up to the model's output limit
+    max_tokens = min(
+        8192 * len(image_paths), int(os.getenv("BATCH_MAX_TOKENS", "16384"))
+    )
+    response = await acompletion(
+        message=_BATCH_USER_PROMPT.format(page_count=len(image_paths)),
+        system_prompt=_BATCH_SYSTEM_PROMPT,
+        image_paths=image_paths,
+        temperature=0.3,
+        max_tokens=max_tokens,
+    )
+
+    # A failed request or a response that does not split into one part per
+    # page is retried page by page; sequentially, since this batch holds only
+    # one of the MPD_CONCURRENCY slots
+    pages = response.split(PAGE_BREAK) if response else []
+    if len(pages) != len(image_paths):
+        logger.warning(
+            "Expected %d pages in batched response but got %d, converting pages individually",
+            len(image_paths),
+            len(pages),
+        )
+        return [
+            await aconvert_image_to_markdown(image_path) for image_path in image_paths
+        ]
+    return [remove_markdown_warp(page, "markdown") for page in pages]
+
+
+async def _gather_bounded(func, items, max_concurrency):
+    """
+    Run an async function over items with at most max_concurrency calls in flight
+    Returns:
+        list: Results, in the same order as items
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _call(item):
+        async with semaphore:
+            return await func(item)
+
+    try:
+        return list(await asyncio.gather(*(_call(item) for item in items)))
+    finally:
+        # The async HTTP client is bound to this event loop, which ends here
+        if _llm_client is not None:
+            await _llm_client.aclose()
+
+
+def convert_images_to_markdown(image_paths, max_concurrency=None):
+    """
+    Convert multiple images to Markdown concurrently
+    Args:
+        image_paths (List[str]): Paths to the images
+        max_concurrency (int, optional): Number of concurrent LLM calls, defaults to get_max_concurrency()
+    Returns:
+        List[str]: Converted Markdown strings, in the same order as image_paths
+    """
+    if max_concurrency is None:
+        max_concurrency = get_max_concurrency()
+    return asyncio.run(
+        _gather_bounded(aconvert_image_to_markdown, image_paths, max_concurrency)
+    )
+
+
+def batch_convert_images_to_markdown(image_paths, batch_size=4, max_concurrency=None):
+    """
+    Convert multiple images to Markdown, sending batch_size images per LLM request
+    Args:
+        image_paths (List[str]): Paths to the images
+        batch_size (int, optional): Number of images per request, defaults to 4
+        max_concurrency (int, optional): Number of concurrent LLM calls, defaults to get_max_concurrency()
+    Returns:
+        List[str]: Converted Markdown strings, in the same order as image_paths
+    """
+    batch_size = max(1, batch_size)
+    batches = [
+        image_paths[i : i + batch_size] for i in range(0, len(image_paths), batch_size)
+    ]
+    if max_concurrency is None:
+        max_concurrency = get_max_concurrency()
+    results = asyncio.run(
+        _gather_bounded(aconvert_batch_to_markdown, batches, max_concurrency)
+    )
+    return [page for pages in results for page in pages]
+
+
 if __name__ == "__main__":
     start_page = 1
     end_page = 0
@@ -130,15 +454,20 @@ if __name__ == "__main__":
         start_page = 1
         end_page = int(sys.argv[1])
 
-    # Read binary data from standard input
-    input_data = sys.stdin.buffer.read()
-    if not input_data:
+    # Read only the leading bytes of standard input for type detection; the
+    # rest is streamed to disk below instead of being held in memory
+    input_head = sys.stdin.buffer.read(16)
+    if not input_head:
         logger.error("No input data received")
         logger.error(
             "Usage: python main.py [start_page] [end_page] < path_to_input.pdf"
         )
         exit(1)
 
+    # Reuse responses from previous runs
+    if os.getenv("MPD_CACHE", "1") != "0":
+        enable_response_cache()
+
     # Create output directory
     output_dir = f"output/{time.strftime('%Y%m%d%H%M%S')}"
     os.makedirs(output_dir, exist_ok=True)
@@ -149,33 +478,15 @@ if __name__ == "__main__":
 
     # If there is no extension or the file comes from standard input, try to determine the type by file content
     if not input_ext or input_filename == "<stdin>":
-        # PDF file magic number/signature is %PDF-
-        if input_data.startswith(b"%PDF-"):
-            input_ext = ".pdf"
-            logger.info("Recognized as PDF file by file content")
-        # JPEG file magic number/signature is FF D8 FF DB
-        elif input_data.startswith(b"\xff\xd8\xff\xdb"):
-            input_ext = ".jpeg"
-            logger.info("Recognized as JPEG file by file content")
-        # JPG file magic number/signature is FF D8 FF E0
-        elif input_data.startswith(b"\xff\xd8\xff\xe0"):
-            input_ext = ".jpg"
-            logger.info("Recognized as JPG file by file content")
-        # PNG file magic number/signature is 89 50 4E 47
-        elif input_data.startswith(b"\x89\x50\x4e\x47"):
-            input_ext = ".png"
-            logger.info("Recognized as PNG file by file content")
-        # BMP file magic number/signature is 42 4D
-        elif input_data.startswith(b"\x42\x4d"):
-            input_ext = ".bmp"
-            logger.info("Recognized as BMP file by file content")
-        else:
+        input_ext = detect_file_type(input_head)
+        if input_ext is None:
             logger.error("Unsupported file type")
             exit(1)
 
     input_path = os.path.join(output_dir, f"input{input_ext}")
     with open(input_path, "wb") as f:
-        f.write(input_data)
+        f.write(input_head)
+        shutil.copyfileobj(sys.stdin.buffer, f, length=1024 * 1024)
 
     # create file worker
     try:
@@ -189,22 +500,32 @@ if __name__ == "__main__":
     logger.info("Image conversion completed")
 
     # convert to markdown
-    markdown = ""
-    for img_path in sorted(img_paths):
-        img_path = img_path.replace("\\", "/")
-        logger.info("Converting image %s to Markdown", img_path)
-        content = convert_image_to_markdown(img_path)
+    img_paths = [img_path.replace("\\", "/") for img_path in sorted(img_paths)]
+    prefetch_files(img_paths)
+    batch_pages = int(os.getenv("BATCH_PAGES", "1"))
+    if batch_pages > 1:
+        results = batch_convert_images_to_markdown(img_paths, batch_size=batch_pages)
+    else:
+        results = convert_images_to_markdown(img_paths)
+    parts = []
+    for img_path, content in zip(img_paths, results):  # noqa: B905 (py3.9)
         if content:
-            # 写入文件
-            with open(
-                os.path.join(output_dir, f"{os.path.basename(img_path)}.md"), "w"
-            ) as f:
-                f.write(content)
-            markdown += content
-            markdown += "\n\n"
+            # Write the page with raw writes; no fsync, the directory is removed below
+            fd = os.open(
+                os.path.join(output_dir, f"{os.path.basename(img_path)}.md"),
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                0o644,
+            )
+            try:
+                data = memoryview(content.encode("utf-8"))
+                while data:
+                    data = data[os.write(fd, data) :]
+            finally:
+                os.close(fd)
+            parts.append(content)
 
     # Output Markdown
-    print(markdown)
+    print("\n\n".join(parts))
     logger.info("Image conversion to Markdown completed")
     # Remote output path
     shutil.rmtree(output_dir)
@@ -0,0 +1,103 @@
+"""Shared pytest fixtures.
+
+Tests may run in parallel under pytest-xdist, so fixtures must not share
+state through the filesystem outside tmp_path/tmp_path_factory, and
+tests must not rely on module globals or sys.modules surviving between
+tests.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from core.providers import reset_providers
+
+# Bytes of a minimal JPEG file (SOI + JFIF APP0 marker)
+JPEG_BYTES = b"\xff\xd8\xff\xe0\x00\x10JFIF"
+
+
+@pytest.fixture(scope="session")
+def jpeg_image(tmp_path_factory):
+    """Write a minimal JPEG file once per session and return its path."""
+    path = tmp_path_factory.mktemp("img") / "test.jpg"
+    path.write_bytes(JPEG_BYTES)
+    return path
+
+
+def _chat_response(content):
+    """Build a minimal chat.completions response."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+    )
+
+
+@pytest.fixture
+def chat_response():
+    """Builder for minimal chat.completions responses, taking the content."""
+    return _chat_response
+
+
+class FakeOpenAIClient:
+    """Stand-in for openai.OpenAI that records chat.completions.create calls.
+
+    Set ``response`` to the value to return (e.g. one built with the
+    chat_response fixture), or to an exception to raise.
+    """
+
+    def __init__(self):
+        self.response = None
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+@pytest.fixture
+def fake_openai_client():
+    """Fresh FakeOpenAIClient to inject as an OpenAIProvider's client."""
+    return FakeOpenAIClient()
+
+
+@pytest.fixture(autouse=True)
+def _clear_provider_cache():
+    """Drop memoized providers so each test sees its own environment and mocks."""
+    reset_providers()
+    yield
+    reset_providers()
+
+
+# Environment variables that configure the providers and the conversion pipeline
+LLM_ENV_KEYS = (
+    "LLM_PROVIDER",
+    "OPENAI_API_KEY",
+    "OPENAI_API_BASE",
+    "OPENAI_DEFAULT_MODEL",
+    "OPENAI_STREAM",
+    "DEEPSEEK_API_KEY",
+    "GEMINI_API_KEY",
+    "GOOGLE_API_KEY",
+    "GEMINI_MODEL",
+    "GEMINI_UPLOAD_THRESHOLD",
+    "LLM_TIMEOUT",
+    "LLM_RETRIES",
+    "LLM_RPM",
+    "MPD_CONCURRENCY",
+    "MPD_IMAGE_MAX_SIZE",
+    "BATCH_PAGES",
+    "BATCH_MAX_TOKENS",
+)
+
+
+@pytest.fixture
+def clean_llm_env(monkeypatch):
+    """Remove provider configuration from the environment.
+
+    Returns the monkeypatch fixture so tests can set the variables they need.
+    """
+    for key in LLM_ENV_KEYS:
+        monkeypatch.delenv(key, raising=False)
+    return monkeypatch
@@ -1,202 +1,473 @@
 """Integration tests for main.py functionality."""
 
-import os
-from unittest.mock import MagicMock, patch
+import asyncio
+import importlib.util
+import sqlite3
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+import main
 
-class TestMainCompletion:
-    """Tests for the completion function in main.py."""
-
-    @patch("main.LLMClient")
-    def test_completion_function(self, mock_llm_client_class):
-        """Test the completion function in main.py."""
-        # Setup mock
-        mock_client = MagicMock()
-        mock_client.completion.return_value = "Generated markdown"
-        mock_llm_client_class.return_value = mock_client
-
-        with patch.dict(
-            os.environ,
-            {"OPENAI_API_KEY": "test-key", "LLM_PROVIDER": "openai"},
-            clear=True,
-        ):
-            # Reset global client
-            import main
-
-            main._llm_client = None
-
-            result = main.completion(
-                message="Convert this",
-                system_prompt="You are helpful",
-                temperature=0.5,
-            )
-
-            assert result == "Generated markdown"
-
-    @patch("main.LLMClient")
-    def test_completion_with_retry(self, mock_llm_client_class):
-        """Test that completion retries on failure."""
-        mock_client = MagicMock()
-        # Fail twice, then succeed
-        mock_client.completion.side_effect = [
-            Exception("First failure"),
-            Exception("Second failure"),
-            "Success on third try",
-        ]
-        mock_llm_client_class.return_value = mock_client
-
-        with patch.dict(
-            os.environ,
-            {"OPENAI_API_KEY": "test-key", "LLM_PROVIDER": "openai"},
-            clear=True,
-        ):
-            import main
 
-            main._llm_client = None
-
-            with patch("time.sleep"):  # Speed up test
-                result = main.completion(
-                    message="Test",
-                    retry_times=3,
-                )
-
-            assert result == "Success on third try"
-            assert mock_client.completion.call_count == 3
-
-    @patch("main.LLMClient")
-    def test_completion_all_retries_fail(self, mock_llm_client_class):
-        """Test that completion returns empty string after all retries fail."""
-        mock_client = MagicMock()
-        mock_client.completion.side_effect = Exception("Always fails")
-        mock_llm_client_class.return_value = mock_client
-
-        with patch.dict(
-            os.environ,
-            {"OPENAI_API_KEY": "test-key", "LLM_PROVIDER": "openai"},
-            clear=True,
-        ):
-            import main
-
-            main._llm_client = None
-
-            with patch("time.sleep"):
-                result = main.completion(
-                    message="Test",
-                    retry_times=3,
-                )
-
-            assert result == ""
-            assert mock_client.completion.call_count == 3
-
-    @patch("main.LLMClient")
-    def test_get_llm_client_singleton(self, mock_llm_client_class):
-        """Test that get_llm_client returns singleton instance."""
-        mock_client = MagicMock()
-        mock_llm_client_class.return_value = mock_client
-
-        with patch.dict(
-            os.environ,
-            {"OPENAI_API_KEY": "test-key", "LLM_PROVIDER": "openai"},
-            clear=True,
-        ):
-            import main
-
-            main._llm_client = None
-
-            client1 = main.get_llm_client()
-            client2 = main.get_llm_client()
-
-            assert client1 is client2
-            # Should only be called once
-            assert mock_llm_client_class.call_count == 1
-
-
-class TestConvertImageToMarkdown:
-    """Tests for convert_image_to_markdown function."""
-
-    @patch("main.completion")
-    def test_convert_image_to_markdown(self, mock_completion, tmp_path):
-        """Test image to markdown conversion."""
-        # Create test image
-        test_image = tmp_path / "test.jpg"
-        test_image.write_bytes(b"\xff\xd8\xff\xe0test")
-
-        mock_completion.return_value = "```markdown\n# Heading\nContent\n```"
-
-        from main import convert_image_to_markdown
-
-        result = convert_image_to_markdown(str(test_image))
-
-        # Should strip markdown wrapper
-        assert result == "# Heading\nContent"
-        mock_completion.assert_called_once()
-
-        # Check that image path was passed
-        call_kwargs = mock_completion.call_args.kwargs
-        assert str(test_image) in call_kwargs["image_paths"]
-
-    @patch("main.completion")
-    def test_convert_image_preserves_content(self, mock_completion):
-        """Test that content is preserved without wrapper."""
-        mock_completion.return_value = "# Title\n\nSome content with **bold** text."
-
-        from main import convert_image_to_markdown
-
-        result = convert_image_to_markdown("/fake/path.jpg")
-
-        # Should return as-is since there's no markdown wrapper
-        assert "# Title" in result
-        assert "**bold**" in result
-
-
-class TestProviderSwitching:
-    """Tests for switching between providers."""
-
-    def test_switch_to_deepseek(self):
-        """Test switching to DeepSeek provider."""
-        with patch.dict(
-            os.environ,
-            {
-                "LLM_PROVIDER": "deepseek",
-                "DEEPSEEK_API_KEY": "deepseek-key",
-            },
-            clear=True,
-        ):
-            import main
-            main._llm_client = None
-
-            client = main.get_llm_client()
-            assert client.provider.name == "deepseek"
-
-    def test_switch_to_openai(self):
-        """Test switching to OpenAI provider."""
-        with patch.dict(
-            os.environ,
-            {
-                "LLM_PROVIDER": "openai",
-                "OPENAI_API_KEY": "openai-key",
-            },
-            clear=True,
-        ):
-            import main
-            main._llm_client = None
-
-            client = main.get_llm_client()
-            assert client.provider.name == "openai"
-
-    def test_default_provider_is_openai(self):
-        """Test that default provider is OpenAI."""
-        with patch.dict(
-            os.environ,
-            {
-                "OPENAI_API_KEY": "test-key",
-            },
-            clear=True,
-        ):
-            import main
-            main._llm_client = None
-
-            client = main.get_llm_client()
-            assert client.provider.name == "openai"
+def _has_genai() -> bool:
+    """Check whether the optional google-genai package is installed."""
+    try:
+        return importlib.util.find_spec("google.genai") is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def _flaky(result, failures):
+    """Build a side effect that raises `failures` times, then returns result."""
+    error = Exception("Transient failure")
+    calls = 0
+
+    def side_effect(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls <= failures:
+            raise error
+        return result
+
+    return side_effect
+
+
+@pytest.fixture(autouse=True)
+def _reset_client():
+    """Reset the global LLM client so each test builds its own."""
+    main._llm_client = None
+    yield
+    main._llm_client = None
+
+
+@pytest.fixture
+def openai_env(clean_llm_env):
+    """Configure the OpenAI provider."""
+    clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+    clean_llm_env.setenv("LLM_PROVIDER", "openai")
+
+
+@pytest.fixture
+def no_sleep():
+    """Skip the backoff between retries."""
+    with patch("time.sleep"), patch("asyncio.sleep", new=AsyncMock()):
+        yield
+
+
+@pytest.mark.usefixtures("openai_env")
+@patch("main.LLMClient")
+def test_completion_function(mock_llm_client_class):
+    """Test the completion function in main.py."""
+    # Setup mock
+    mock_client = MagicMock()
+    mock_client.completion.return_value = "Generated markdown"
+    mock_llm_client_class.return_value = mock_client
+
+    result = main.completion(
+        message="Convert this",
+        system_prompt="You are helpful",
+        temperature=0.5,
+    )
+
+    assert result == "Generated markdown"
+
+
+@pytest.mark.slow
+@pytest.mark.usefixtures("no_sleep", "openai_env")
+@patch("main.LLMClient")
+def test_completion_with_retry(mock_llm_client_class):
+    """Test that completion retries on failure."""
+    mock_client = MagicMock()
+    # Fail twice, then succeed
+    mock_client.completion.side_effect = _flaky("Success on third try", failures=2)
+    mock_llm_client_class.return_value = mock_client
+
+    result = main.completion(
+        message="Test",
+        retry_times=3,
+    )
+
+    assert result == "Success on third try"
+    assert mock_client.completion.call_count == 3
+
+
+@pytest.mark.slow
+@pytest.mark.usefixtures("no_sleep", "openai_env")
+@patch("main.LLMClient")
+def test_completion_all_retries_fail(mock_llm_client_class):
+    """Test that completion returns empty string after all retries fail."""
+    mock_client = MagicMock()
+    mock_client.completion.side_effect = Exception("Always fails")
+    mock_llm_client_class.return_value = mock_client
+
+    result = main.completion(
+        message="Test",
+        retry_times=2,
+    )
+
+    assert result == ""
+    assert mock_client.completion.call_count == 2
+
+
+@pytest.mark.usefixtures("no_sleep", "openai_env")
+@pytest.mark.parametrize("max_retries,expected_calls", [(3, 1), (0, 3)])
+@patch("main.LLMClient")
+def test_completion_default_retries(mock_llm_client_class, max_retries, expected_calls):
+    """Test that calls are only retried when the provider does not retry itself."""
+    mock_client = MagicMock()
+    mock_client.provider.max_retries = max_retries
+    mock_client.completion.side_effect = Exception("Always fails")
+    mock_llm_client_class.return_value = mock_client
+
+    assert main.completion(message="Test") == ""
+    assert mock_client.completion.call_count == expected_calls
+
+
+@pytest.mark.usefixtures("openai_env")
+@patch("main.LLMClient")
+def test_completion_uses_response_cache(mock_llm_client_class, tmp_path):
+    """Test that repeated requests are served from the response cache."""
+    mock_client = MagicMock()
+    mock_client.provider.name = "openai"
+    mock_client.provider.model = "gpt-4o"
+    mock_client.completion.return_value = "Generated markdown"
+    mock_llm_client_class.return_value = mock_client
+
+    main.enable_response_cache(str(tmp_path / "cache.sqlite"))
+    try:
+        result1 = main.completion(message="Convert this")
+        result2 = main.completion(message="Convert this")
+    finally:
+        main._response_cache = None
+
+    assert result1 == result2 == "Generated markdown"
+    assert mock_client.completion.call_count == 1
+
+
+@patch("main.LLMClient")
+def test_response_cache_keyed_on_image_max_size(
+    mock_llm_client_class, openai_env, clean_llm_env, tmp_path
+):
+    """Test that changing MPD_IMAGE_MAX_SIZE does not reuse cached responses."""
+    mock_client = MagicMock()
+    mock_client.provider.name = "openai"
+    mock_client.provider.model = "gpt-4o"
+    mock_client.completion.return_value = "Generated markdown"
+    mock_llm_client_class.return_value = mock_client
+
+    main.enable_response_cache(str(tmp_path / "cache.sqlite"))
+    try:
+        for max_size in ("1000", "2000", "2000"):
+            clean_llm_env.setenv("MPD_IMAGE_MAX_SIZE", max_size)
+            main.completion(message="Convert this")
+    finally:
+        main._response_cache = None
+
+    assert mock_client.completion.call_count == 2
+
+
+@pytest.mark.usefixtures("openai_env")
+@patch("main.LLMClient")
+def test_acompletion_uses_response_cache(mock_llm_client_class, tmp_path):
+    """Test that the async completion reads and fills the response cache."""
+    mock_client = MagicMock()
+    mock_client.provider.name = "openai"
+    mock_client.provider.model = "gpt-4o"
+    mock_client.acompletion = AsyncMock(return_value="Generated markdown")
+    mock_llm_client_class.return_value = mock_client
+
+    main.enable_response_cache(str(tmp_path / "cache.sqlite"))
+    try:
+        result1 = asyncio.run(main.acompletion(message="Convert this"))
+        result2 = asyncio.run(main.acompletion(message="Convert this"))
+    finally:
+        main._response_cache = None
+
+    assert result1 == result2 == "Generated markdown"
+    assert mock_client.acompletion.await_count == 1
+
+
+@pytest.mark.usefixtures("openai_env")
+@patch("main.LLMClient")
+def test_acompletion_survives_response_cache_errors(mock_llm_client_class):
+    """Test that cache read/write errors do not discard the LLM response."""
+    mock_client = MagicMock()
+    mock_client.acompletion = AsyncMock(return_value="Generated markdown")
+    mock_llm_client_class.return_value = mock_client
+
+    main._response_cache = MagicMock()
+    main._response_cache.get.return_value = None
+    main._response_cache.set.side_effect = sqlite3.OperationalError("locked")
+    try:
+        result1 = asyncio.run(main.acompletion(message="Convert this"))
+        main._response_cache.get.side_effect = sqlite3.OperationalError("locked")
+        result2 = asyncio.run(main.acompletion(message="Convert this"))
+    finally:
+        main._response_cache = None
+
+    assert result1 == result2 == "Generated markdown"
+    assert mock_client.acompletion.await_count == 2
+
+
+def test_enable_response_cache_unavailable(tmp_path):
+    """Test that an unusable cache path disables the cache instead of failing."""
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+
+    try:
+        assert main.enable_response_cache(str(blocker / "cache.sqlite")) is None
+        assert main._response_cache is None
+    finally:
+        main._response_cache = None
+
+
+@pytest.mark.slow
+@pytest.mark.usefixtures("no_sleep", "openai_env")
+@patch("main.LLMClient")
+def test_acompletion_with_retry(mock_llm_client_class):
+    """Test that the async completion retries on failure."""
+    mock_client = MagicMock()
+    mock_client.acompletion = AsyncMock(
+        side_effect=_flaky("Success on second try", failures=1)
+    )
+    mock_llm_client_class.return_value = mock_client
+
+    result = asyncio.run(main.acompletion(message="Test", retry_times=2))
+
+    assert result == "Success on second try"
+    assert mock_client.acompletion.await_count == 2
+
+
+@pytest.mark.usefixtures("openai_env")
+@patch("main.LLMClient")
+def test_get_llm_client_singleton(mock_llm_client_class):
+    """Test that get_llm_client returns singleton instance."""
+    mock_client = MagicMock()
+    mock_llm_client_class.return_value = mock_client
+
+    client1 = main.get_llm_client()
+    client2 = main.get_llm_client()
+
+    assert client1 is client2
+    # Should only be called once
+    assert mock_llm_client_class.call_count == 1
+
+
+@patch("main.completion")
+def test_convert_image_to_markdown(mock_completion, jpeg_image):
+    """Test image to markdown conversion."""
+    mock_completion.return_value = "```markdown\n# Heading\nContent\n```"
+
+    result = main.convert_image_to_markdown(str(jpeg_image))
+
+    # Should strip markdown wrapper
+    assert result == "# Heading\nContent"
+    mock_completion.assert_called_once()
+
+    # Check that image path was passed
+    call_kwargs = mock_completion.call_args.kwargs
+    assert str(jpeg_image) in call_kwargs["image_paths"]
+
+
+@patch("main.completion")
+def test_convert_image_preserves_content(mock_completion):
+    """Test that content is preserved without wrapper."""
+    mock_completion.return_value = "# Title\n\nSome content with **bold** text."
+
+    result = main.convert_image_to_markdown("/fake/path.jpg")
+
+    # Should return as-is since there's no markdown wrapper
+    assert "# Title" in result
+    assert "**bold**" in result
+
+
+@patch("main.aconvert_image_to_markdown")
+def test_convert_images_preserves_order(mock_convert):
+    """Test that concurrent conversion returns results in input order."""
+    mock_convert.side_effect = lambda path: f"# {path}"
+
+    paths = [f"page_{i:04d}.jpg" for i in range(1, 11)]
+    result = main.convert_images_to_markdown(paths, max_concurrency=4)
+
+    assert result == [f"# {path}" for path in paths]
+    assert mock_convert.await_count == len(paths)
+
+
+@patch("main.aconvert_image_to_markdown")
+def test_convert_images_closes_async_client(mock_convert):
+    """Test that the async client is released when the event loop finishes."""
+    mock_convert.side_effect = lambda path: f"# {path}"
+    main._llm_client = MagicMock(aclose=AsyncMock())
+
+    main.convert_images_to_markdown(["page_0001.jpg"])
+
+    main._llm_client.aclose.assert_awaited_once()
+
+
+@patch("main.aconvert_image_to_markdown")
+def test_convert_images_empty(mock_convert):
+    """Test that an empty image list yields no results."""
+    assert main.convert_images_to_markdown([]) == []
+    mock_convert.assert_not_called()
+
+
+@patch("main.acompletion")
+def test_aconvert_image_to_markdown(mock_acompletion):
+    """Test asynchronous image to markdown conversion."""
+    mock_acompletion.return_value = "```markdown\n# Heading\n```"
+
+    result = asyncio.run(main.aconvert_image_to_markdown("/fake/path.jpg"))
+
+    assert result == "# Heading"
+    assert mock_acompletion.call_args.kwargs["image_paths"] == ["/fake/path.jpg"]
+
+
+class TestBatchConvertImagesToMarkdown:
+    """Tests for batched multi-image conversion."""
+
+    @patch("main.acompletion")
+    def test_batch_splits_on_page_break(self, mock_acompletion, clean_llm_env):
+        """Test that a batched response is split into one result per page."""
+        mock_acompletion.return_value = (
+            f"```markdown\n# Page 1\n```\n{main.PAGE_BREAK}\n# Page 2"
+        )
+
+        result = asyncio.run(main.aconvert_batch_to_markdown(["p1.jpg", "p2.jpg"]))
+
+        assert result == ["# Page 1", "# Page 2"]
+        call_kwargs = mock_acompletion.call_args.kwargs
+        assert call_kwargs["image_paths"] == ["p1.jpg", "p2.jpg"]
+        assert call_kwargs["max_tokens"] == 8192 * 2
+
+    @pytest.mark.parametrize(
+        "env,expected", [({}, 16384), ({"BATCH_MAX_TOKENS": "20000"}, 20000)]
+    )
+    @patch("main.acompletion")
+    def test_batch_max_tokens_is_capped(
+        self, mock_acompletion, clean_llm_env, env, expected
+    ):
+        """Test that the batched token budget is capped at BATCH_MAX_TOKENS."""
+        for key, value in env.items():
+            clean_llm_env.setenv(key, value)
+        mock_acompletion.return_value = main.PAGE_BREAK.join(["# Page"] * 4)
+
+        asyncio.run(main.aconvert_batch_to_markdown([f"p{i}.jpg" for i in range(4)]))
+
+        assert mock_acompletion.call_args.kwargs["max_tokens"] == expected
+
+    @patch("main.aconvert_image_to_markdown")
+    @patch("main.acompletion")
+    def test_batch_falls_back_on_failed_request(self, mock_acompletion, mock_convert):
+        """Test that pages are converted individually if the batch request fails."""
+        mock_acompletion.return_value = ""
+        mock_convert.side_effect = lambda path: f"# {path}"
+
+        result = asyncio.run(main.aconvert_batch_to_markdown(["p1.jpg", "p2.jpg"]))
+
+        assert result == ["# p1.jpg", "# p2.jpg"]
+        assert mock_convert.await_count == 2
+
+    @patch("main.aconvert_image_to_markdown")
+    @patch("main.acompletion")
+    def test_batch_falls_back_on_page_count_mismatch(
+        self, mock_acompletion, mock_convert
+    ):
+        """Test that pages are converted individually if the split count is off."""
+        mock_acompletion.return_value = "# Only one page"
+        mock_convert.side_effect = lambda path: f"# {path}"
+
+        result = asyncio.run(main.aconvert_batch_to_markdown(["p1.jpg", "p2.jpg"]))
+
+        assert result == ["# p1.jpg", "# p2.jpg"]
+        assert mock_convert.await_count == 2
+
+    @patch("main.aconvert_image_to_markdown")
+    @patch("main.acompletion")
+    def test_batch_fallback_respects_concurrency(self, mock_acompletion, mock_convert):
+        """Test that per-page fallback stays within max_concurrency requests."""
+        mock_acompletion.return_value = ""
+        in_flight = peak = 0
+
+        async def convert(path):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return f"# {path}"
+
+        mock_convert.side_effect = convert
+
+        paths = [f"page_{i:04d}.jpg" for i in range(1, 9)]
+        result = main.batch_convert_images_to_markdown(
+            paths, batch_size=4, max_concurrency=2
+        )
+
+        assert result == [f"# {path}" for path in paths]
+        assert peak == 2
+
+    @patch("main.aconvert_batch_to_markdown")
+    def test_batch_convert_preserves_order(self, mock_convert_batch):
+        """Test that batches are chunked and flattened in input order."""
+        mock_convert_batch.side_effect = lambda batch: [f"# {p}" for p in batch]
+
+        paths = [f"page_{i:04d}.jpg" for i in range(1, 10)]
+        result = main.batch_convert_images_to_markdown(paths, batch_size=4)
+
+        assert result == [f"# {path}" for path in paths]
+        sizes = sorted(len(c.args[0]) for c in mock_convert_batch.call_args_list)
+        assert sizes == [1, 4, 4]  # batches may run in any order
+
+
+@pytest.mark.parametrize(
+    "env,expected",
+    [
+        pytest.param({"OPENAI_API_KEY": "test-key"}, "openai", id="default"),
+        pytest.param(
+            {"LLM_PROVIDER": "openai", "OPENAI_API_KEY": "openai-key"},
+            "openai",
+            id="openai",
+        ),
+        pytest.param(
+            {"LLM_PROVIDER": "deepseek", "DEEPSEEK_API_KEY": "deepseek-key"},
+            "deepseek",
+            id="deepseek",
+        ),
+        pytest.param(
+            {"LLM_PROVIDER": "gemini", "GEMINI_API_KEY": "gemini-key"},
+            "gemini",
+            id="gemini",
+            marks=pytest.mark.skipif(
+                not _has_genai(), reason="google-genai is not installed"
+            ),
+        ),
+    ],
+)
+def test_provider_switch(clean_llm_env, env, expected):
+    """Test that LLM_PROVIDER selects the provider (OpenAI by default)."""
+    for key, value in env.items():
+        clean_llm_env.setenv(key, value)
+
+    client = main.get_llm_client()
+    assert client.provider.name == expected
+
+
+class TestDetectFileType:
+    """Tests for detect_file_type."""
+
+    @pytest.mark.parametrize(
+        "data,expected",
+        [
+            (b"%PDF-1.7\n", ".pdf"),
+            (b"\xff\xd8\xff\xdb\x00", ".jpeg"),
+            (b"\xff\xd8\xff\xe0\x00\x10JFIF", ".jpg"),
+            (b"\x89PNG\r\n\x1a\n", ".png"),
+            (b"BM\x00\x00", ".bmp"),
+            (b"GIF89a", None),
+            (b"", None),
+        ],
+    )
+    def test_detect_file_type(self, data, expected):
+        """Test signature-based file type detection."""
+        assert main.detect_file_type(data) == expected
@@ -1,358 +1,666 @@
 """Tests for the provider abstraction layer."""
 
-import os
-from unittest.mock import MagicMock, patch
+import asyncio
+import io
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from PIL import Image
 
 from core.providers import (
     BaseProvider,
     GeminiProvider,
     OpenAIProvider,
     create_provider,
+    reset_providers,
 )
-from core.providers.base import BaseProvider as BaseProviderClass
+
+# Base64 encoding of the conftest jpeg_image fixture contents
+_JPEG_B64 = "/9j/4AAQSkZJRg=="
+
+
+class ConcreteProvider(BaseProvider):
+    """Minimal concrete provider for testing the base class helpers."""
+
+    @property
+    def name(self):
+        return "test"
+
+    def completion(self, *args, **kwargs):
+        return "test"
+
+
+@pytest.fixture(scope="module")
+def concrete_provider():
+    """Shared ConcreteProvider instance."""
+    return ConcreteProvider()
 
 
 class TestCreateProvider:
     """Tests for the create_provider factory function."""
 
-    def test_create_provider_default_is_openai(self):
+    def test_create_provider_default_is_openai(self, clean_llm_env):
         """Default provider should be OpenAI when no env var is set."""
-        with patch.dict(os.environ, {}, clear=True):
-            # Need to set API key for OpenAI provider to initialize
-            with patch.dict(os.environ, {"OPENAI_API_KEY": "test-key"}):
-                provider = create_provider()
-                assert isinstance(provider, OpenAIProvider)
-                assert provider.name in ["openai", "deepseek"]
-
-    def test_create_provider_openai_explicit(self):
+        # Need to set API key for OpenAI provider to initialize
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+
+        provider = create_provider()
+        assert isinstance(provider, OpenAIProvider)
+        assert provider.name == "openai"
+
+    def test_create_provider_openai_explicit(self, clean_llm_env):
         """Explicitly requesting OpenAI provider."""
-        with patch.dict(os.environ, {"OPENAI_API_KEY": "test-key"}):
-            provider = create_provider("openai")
-            assert isinstance(provider, OpenAIProvider)
-            assert provider.name == "openai"
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
 
-    def test_create_provider_deepseek(self):
+        provider = create_provider("openai")
+        assert isinstance(provider, OpenAIProvider)
+        assert provider.name == "openai"
+
+    def test_create_provider_deepseek(self, clean_llm_env):
         """DeepSeek provider should use OpenAI-compatible provider."""
-        with patch.dict(
-            os.environ,
-            {"LLM_PROVIDER": "deepseek", "OPENAI_API_KEY": "test-deepseek-key"},
-        ):
-            provider = create_provider("deepseek")
-            assert isinstance(provider, OpenAIProvider)
-            assert provider.name == "deepseek"
+        clean_llm_env.setenv("LLM_PROVIDER", "deepseek")
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-deepseek-key")
 
-    def test_create_provider_gemini(self):
+        provider = create_provider("deepseek")
+        assert isinstance(provider, OpenAIProvider)
+        assert provider.name == "deepseek"
+
+    def test_create_provider_gemini(self, clean_llm_env):
         """Gemini provider should be created when requested."""
-        with patch.dict(os.environ, {"GEMINI_API_KEY": "test-gemini-key"}):
-            # Mock the google.genai import
-            mock_genai = MagicMock()
-            mock_types = MagicMock()
-            with patch.dict(
-                "sys.modules",
-                {"google": MagicMock(), "google.genai": mock_genai},
-            ):
-                with patch(
-                    "core.providers.gemini_provider.GeminiProvider.__init__",
-                    return_value=None,
-                ):
-                    provider = create_provider("gemini")
-                    assert isinstance(provider, GeminiProvider)
-
-    def test_create_provider_from_env_var(self):
-        """Provider should be selected from LLM_PROVIDER env var."""
+        clean_llm_env.setenv("GEMINI_API_KEY", "test-gemini-key")
+
+        # Mock the google.genai import
+        mock_genai = MagicMock()
         with patch.dict(
-            os.environ,
-            {"LLM_PROVIDER": "deepseek", "OPENAI_API_KEY": "test-key"},
+            "sys.modules",
+            {"google": MagicMock(), "google.genai": mock_genai},
         ):
-            provider = create_provider()  # No argument, uses env var
-            assert isinstance(provider, OpenAIProvider)
-            assert provider.name == "deepseek"
+            with patch(
+                "core.providers.gemini_provider.GeminiProvider.__init__",
+                return_value=None,
+            ):
+                provider = create_provider("gemini")
+                assert isinstance(provider, GeminiProvider)
+
+    def test_create_provider_from_env_var(self, clean_llm_env):
+        """Provider should be selected from LLM_PROVIDER env var."""
+        clean_llm_env.setenv("LLM_PROVIDER", "deepseek")
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+
+        provider = create_provider()  # No argument, uses env var
+        assert isinstance(provider, OpenAIProvider)
+        assert provider.name == "deepseek"
 
     def test_create_provider_unknown_raises_error(self):
         """Unknown provider should raise ValueError."""
         with pytest.raises(ValueError, match="Unknown provider"):
             create_provider("unknown_provider")
 
-    def test_create_provider_case_insensitive(self):
-        """Provider name should be case-insensitive."""
-        with patch.dict(
-            os.environ, {"OPENAI_API_KEY": "test-key", "LLM_PROVIDER": "openai"}
-        ):
-            provider1 = create_provider("OPENAI")
+    def test_create_provider_reuses_instance(self, clean_llm_env):
+        """Provider instances should be created once per name and reused."""
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        clean_llm_env.setenv("LLM_PROVIDER", "openai")
+
+        with patch.object(OpenAIProvider, "__init__", return_value=None) as init:
+            provider1 = create_provider("openai")
             provider2 = create_provider("OpenAI")
-            provider3 = create_provider("openai")
-            assert all(
-                isinstance(p, OpenAIProvider) for p in [provider1, provider2, provider3]
-            )
 
+            assert provider1 is provider2
+            assert init.call_count == 1
 
-class TestBaseProvider:
-    """Tests for the BaseProvider abstract class."""
+            reset_providers()
+            assert create_provider("openai") is not provider1
 
-    def test_base_provider_is_abstract(self):
-        """BaseProvider should not be directly instantiable."""
-        with pytest.raises(TypeError):
-            BaseProviderClass()
+    def test_create_provider_name_overrides_env(self, clean_llm_env):
+        """The requested name should configure the provider, not LLM_PROVIDER."""
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        clean_llm_env.setenv("LLM_PROVIDER", "openai")
 
-    def test_encode_image_to_base64(self, tmp_path):
-        """Test image encoding to base64."""
-        # Create a simple test image file
-        test_image = tmp_path / "test.jpg"
-        test_content = b"\xff\xd8\xff\xe0\x00\x10JFIF"  # JPEG header
-        test_image.write_bytes(test_content)
+        provider = create_provider("deepseek")
 
-        # Create a concrete implementation for testing
-        class ConcreteProvider(BaseProviderClass):
-            @property
-            def name(self):
-                return "test"
+        assert provider.name == "deepseek"
+        assert provider.base_url == "https://api.deepseek.com/v1"
+        clean_llm_env.setenv("LLM_PROVIDER", "deepseek")
+        assert create_provider() is provider
+        assert create_provider("openai").name == "openai"
 
-            def completion(self, *args, **kwargs):
-                return "test"
+    @patch("openai.OpenAI")
+    def test_reset_providers_closes_http_client(self, mock_openai_class, clean_llm_env):
+        """reset_providers() should close the shared connection pool."""
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
 
-        provider = ConcreteProvider()
-        encoded = provider.encode_image_to_base64(str(test_image))
+        with patch("httpx.Client") as mock_httpx_client:
+            create_provider("openai")
+            reset_providers()
 
-        import base64
+        mock_httpx_client.return_value.close.assert_called_once()
 
-        decoded = base64.b64decode(encoded)
-        assert decoded == test_content
+    @pytest.mark.parametrize("name", ["OPENAI", "OpenAI", "openai"])
+    def test_create_provider_case_insensitive(self, clean_llm_env, name):
+        """Provider name should be case-insensitive."""
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        clean_llm_env.setenv("LLM_PROVIDER", "openai")
 
-    def test_get_image_mime_type(self):
-        """Test MIME type detection from file extension."""
+        provider = create_provider(name)
+        assert isinstance(provider, OpenAIProvider)
+        assert provider.name == "openai"
 
-        class ConcreteProvider(BaseProviderClass):
-            @property
-            def name(self):
-                return "test"
 
-            def completion(self, *args, **kwargs):
-                return "test"
+class TestBaseProvider:
+    """Tests for the BaseProvider abstract class."""
 
-        provider = ConcreteProvider()
+    def test_base_provider_is_abstract(self):
+        """BaseProvider should not be directly instantiable."""
+        with pytest.raises(TypeError):
+            BaseProvider()
 
-        assert provider.get_image_mime_type("test.jpg") == "image/jpeg"
-        assert provider.get_image_mime_type("test.jpeg") == "image/jpeg"
-        assert provider.get_image_mime_type("test.png") == "image/png"
-        assert provider.get_image_mime_type("test.gif") == "image/gif"
-        assert provider.get_image_mime_type("test.webp") == "image/webp"
-        assert provider.get_image_mime_type("test.bmp") == "image/bmp"
-        assert provider.get_image_mime_type("test.unknown") == "image/jpeg"  # Default
+    def test_encode_image_to_base64(self, concrete_provider, jpeg_image):
+        """Test image encoding to base64."""
+        assert concrete_provider.encode_image_to_base64(str(jpeg_image)) == _JPEG_B64
+
+    def test_prepare_image_for_vision_reencodes_to_webp(self, tmp_path, monkeypatch):
+        """Large images should be downscaled and re-encoded as WebP."""
+        test_image = tmp_path / "page.png"
+        Image.effect_noise((400, 200), 64).convert("RGB").save(test_image)
+
+        monkeypatch.setenv("MPD_IMAGE_MAX_SIZE", "100")
+
+        data, mime_type = BaseProvider.prepare_image_for_vision(str(test_image))
+
+        assert mime_type == "image/webp"
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.size == (100, 50)
+
+    def test_prepare_image_for_vision_follows_max_size(self, tmp_path, monkeypatch):
+        """Changing MPD_IMAGE_MAX_SIZE should not serve a stale cached image."""
+        test_image = tmp_path / "page.png"
+        Image.effect_noise((400, 200), 64).convert("RGB").save(test_image)
+
+        sizes = []
+        for max_size in ("100", "200"):
+            monkeypatch.setenv("MPD_IMAGE_MAX_SIZE", max_size)
+            data, _ = BaseProvider.prepare_image_for_vision(str(test_image))
+            with Image.open(io.BytesIO(data)) as img:
+                sizes.append(img.size)
+
+        assert sizes == [(100, 50), (200, 100)]
+
+    def test_prepare_image_for_vision_keeps_undecodable_images(self, jpeg_image):
+        """Images that cannot be decoded should be sent unchanged."""
+        data, mime_type = BaseProvider.prepare_image_for_vision(str(jpeg_image))
+
+        assert data == jpeg_image.read_bytes()
+        assert mime_type == "image/jpeg"
+
+    def test_prepare_image_for_vision_disabled(self, tmp_path, monkeypatch):
+        """MPD_IMAGE_MAX_SIZE=0 should disable re-encoding."""
+        test_image = tmp_path / "test.png"
+        test_image.write_bytes(b"\x89PNG\r\n\x1a\ntest data")
+
+        monkeypatch.setenv("MPD_IMAGE_MAX_SIZE", "0")
+
+        data, mime_type = BaseProvider.prepare_image_for_vision(str(test_image))
+
+        assert data == b"\x89PNG\r\n\x1a\ntest data"
+        assert mime_type == "image/png"
+
+    @pytest.mark.parametrize(
+        "filename,expected",
+        [
+            ("test.jpg", "image/jpeg"),
+            ("test.jpeg", "image/jpeg"),
+            ("test.png", "image/png"),
+            ("test.gif", "image/gif"),
+            ("test.webp", "image/webp"),
+            ("test.bmp", "image/bmp"),
+            ("test.unknown", "image/jpeg"),  # Default
+        ],
+    )
+    def test_get_image_mime_type(self, concrete_provider, filename, expected):
+        """Test MIME type detection from file extension."""
+        assert concrete_provider.get_image_mime_type(filename) == expected
 
 
-class TestOpenAIProvider:
-    """Tests for the OpenAI provider."""
+@pytest.fixture(scope="class")
+def openai_provider():
+    """OpenAIProvider shared by a test class.
 
-    def test_openai_provider_initialization(self):
-        """OpenAI provider should initialize with API key."""
-        with patch.dict(
-            os.environ,
-            {
-                "OPENAI_API_KEY": "test-key",
-                "LLM_PROVIDER": "openai",
-            },
-            clear=True,
-        ):
-            provider = OpenAIProvider()
-            assert provider.name == "openai"
-            assert provider.api_key == "test-key"
-            assert provider.model == "gpt-4o"  # Default model
+    Tests inject a fake client with monkeypatch.setattr(provider, "client", ...).
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        for key in ("OPENAI_API_BASE", "OPENAI_DEFAULT_MODEL", "OPENAI_STREAM"):
+            mp.delenv(key, raising=False)
+        mp.setenv("OPENAI_API_KEY", "test-key")
+        mp.setenv("LLM_PROVIDER", "openai")
+        return OpenAIProvider()
 
-    def test_openai_provider_custom_model(self):
-        """OpenAI provider should use custom model from env."""
-        with patch.dict(
-            os.environ,
-            {
-                "OPENAI_API_KEY": "test-key",
-                "OPENAI_DEFAULT_MODEL": "gpt-4o-mini",
-                "LLM_PROVIDER": "openai",
-            },
-            clear=True,
-        ):
-            provider = OpenAIProvider()
-            assert provider.model == "gpt-4o-mini"
 
-    def test_openai_provider_custom_base_url(self):
-        """OpenAI provider should use custom base URL from env."""
-        with patch.dict(
-            os.environ,
-            {
-                "OPENAI_API_KEY": "test-key",
-                "OPENAI_API_BASE": "https://custom.api.com/v1",
-                "LLM_PROVIDER": "openai",
-            },
-            clear=True,
-        ):
-            provider = OpenAIProvider()
-            assert provider.base_url == "https://custom.api.com/v1"
+class TestOpenAIProvider:
+    """Tests for the OpenAI provider."""
 
-    def test_openai_provider_missing_api_key_raises(self):
-        """OpenAI provider should raise error when API key is missing."""
-        with patch.dict(os.environ, {}, clear=True):
+    @pytest.mark.parametrize(
+        "env,expected",
+        [
+            pytest.param(
+                {"OPENAI_API_KEY": "test-key", "LLM_PROVIDER": "openai"},
+                {"name": "openai", "api_key": "test-key", "model": "gpt-4o"},
+                id="openai-defaults",
+            ),
+            pytest.param(
+                {
+                    "OPENAI_API_KEY": "test-key",
+                    "OPENAI_DEFAULT_MODEL": "gpt-4o-mini",
+                    "LLM_PROVIDER": "openai",
+                },
+                {"model": "gpt-4o-mini"},
+                id="custom-model",
+            ),
+            pytest.param(
+                {
+                    "OPENAI_API_KEY": "test-key",
+                    "OPENAI_API_BASE": "https://custom.api.com/v1",
+                    "LLM_PROVIDER": "openai",
+                },
+                {"base_url": "https://custom.api.com/v1"},
+                id="custom-base-url",
+            ),
+            pytest.param(
+                {"DEEPSEEK_API_KEY": "deepseek-key", "LLM_PROVIDER": "deepseek"},
+                {
+                    "name": "deepseek",
+                    "api_key": "deepseek-key",
+                    "base_url": "https://api.deepseek.com/v1",
+                    "model": "deepseek-chat",
+                },
+                id="deepseek-defaults",
+            ),
+            pytest.param(
+                {"OPENAI_API_KEY": "fallback-key", "LLM_PROVIDER": "deepseek"},
+                {"api_key": "fallback-key"},
+                id="deepseek-openai-key-fallback",
+            ),
+            pytest.param({}, ValueError, id="missing-api-key"),
+        ],
+    )
+    def test_openai_provider_initialization(self, clean_llm_env, env, expected):
+        """OpenAI provider should be configured from the environment."""
+        for key, value in env.items():
+            clean_llm_env.setenv(key, value)
+
+        if expected is ValueError:
             with pytest.raises(ValueError, match="API key not found"):
                 OpenAIProvider()
+            return
 
-    def test_deepseek_provider_initialization(self):
-        """DeepSeek provider should use DeepSeek defaults."""
-        with patch.dict(
-            os.environ,
-            {
-                "DEEPSEEK_API_KEY": "deepseek-key",
-                "LLM_PROVIDER": "deepseek",
-            },
-            clear=True,
-        ):
-            provider = OpenAIProvider()
-            assert provider.name == "deepseek"
-            assert provider.api_key == "deepseek-key"
-            assert provider.base_url == "https://api.deepseek.com/v1"
-            assert provider.model == "deepseek-chat"
-
-    def test_deepseek_fallback_to_openai_key(self):
-        """DeepSeek should fall back to OPENAI_API_KEY if DEEPSEEK_API_KEY not set."""
-        with patch.dict(
-            os.environ,
-            {
-                "OPENAI_API_KEY": "fallback-key",
-                "LLM_PROVIDER": "deepseek",
-            },
-            clear=True,
-        ):
-            provider = OpenAIProvider()
-            assert provider.api_key == "fallback-key"
+        provider = OpenAIProvider()
+        for attr, value in expected.items():
+            assert getattr(provider, attr) == value
 
     @patch("openai.OpenAI")
-    def test_openai_provider_completion(self, mock_openai_class):
-        """Test completion method of OpenAI provider."""
-        # Setup mock
-        mock_client = MagicMock()
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock()]
-        mock_response.choices[0].message.content = "Test response"
-        mock_client.chat.completions.create.return_value = mock_response
-        mock_openai_class.return_value = mock_client
-
-        with patch.dict(
-            os.environ,
-            {"OPENAI_API_KEY": "test-key", "LLM_PROVIDER": "openai"},
-            clear=True,
-        ):
-            provider = OpenAIProvider()
-            result = provider.completion(
-                user_message="Hello",
-                system_prompt="You are helpful",
-                temperature=0.5,
-                max_tokens=100,
-            )
-
-            assert result == "Test response"
-            mock_client.chat.completions.create.assert_called_once()
+    def test_openai_provider_timeout_and_retries(
+        self, mock_openai_class, clean_llm_env
+    ):
+        """OpenAI provider should configure client timeout and retries from env."""
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        clean_llm_env.setenv("LLM_TIMEOUT", "45")
+        clean_llm_env.setenv("LLM_RETRIES", "5")
+
+        provider = OpenAIProvider()
+        assert provider.timeout == 45.0
+        assert provider.max_retries == 5
+
+        call_kwargs = mock_openai_class.call_args.kwargs
+        assert call_kwargs["timeout"].read == 45.0
+        assert call_kwargs["timeout"].connect == 5.0
+        assert call_kwargs["max_retries"] == 5
 
     @patch("openai.OpenAI")
-    def test_openai_provider_completion_with_images(self, mock_openai_class, tmp_path):
-        """Test completion with image input."""
-        # Create test image
-        test_image = tmp_path / "test.jpg"
-        test_image.write_bytes(b"\xff\xd8\xff\xe0test image data")
+    def test_openai_provider_uses_http2_client(self, mock_openai_class, clean_llm_env):
+        """OpenAI provider should pass an HTTP/2-enabled httpx client."""
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        clean_llm_env.setenv("LLM_PROVIDER", "openai")
 
-        # Setup mock
-        mock_client = MagicMock()
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock()]
-        mock_response.choices[0].message.content = "Image description"
-        mock_client.chat.completions.create.return_value = mock_response
-        mock_openai_class.return_value = mock_client
+        with patch("httpx.Client") as mock_httpx_client:
+            OpenAIProvider()
 
-        with patch.dict(
-            os.environ,
-            {"OPENAI_API_KEY": "test-key", "LLM_PROVIDER": "openai"},
-            clear=True,
-        ):
-            provider = OpenAIProvider()
-            result = provider.completion(
-                user_message="Describe this image",
-                image_paths=[str(test_image)],
-            )
+        assert mock_httpx_client.call_args.kwargs["http2"] is True
+        assert (
+            mock_openai_class.call_args.kwargs["http_client"]
+            is mock_httpx_client.return_value
+        )
 
-            assert result == "Image description"
-            # Verify the call included image data
-            call_args = mock_client.chat.completions.create.call_args
-            messages = call_args.kwargs["messages"]
-            user_content = messages[-1]["content"]
-            assert any(item.get("type") == "image_url" for item in user_content)
+    @patch("openai.OpenAI")
+    def test_openai_providers_share_http_client(self, mock_openai_class, clean_llm_env):
+        """OpenAI-compatible providers should share one connection pool."""
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        clean_llm_env.setenv("DEEPSEEK_API_KEY", "deepseek-key")
+
+        with patch("httpx.Client") as mock_httpx_client:
+            clean_llm_env.setenv("LLM_PROVIDER", "openai")
+            OpenAIProvider()
+            clean_llm_env.setenv("LLM_PROVIDER", "deepseek")
+            OpenAIProvider()
+
+        mock_httpx_client.assert_called_once()
+        first, second = mock_openai_class.call_args_list
+        assert first.kwargs["http_client"] is second.kwargs["http_client"]
+
+    def test_openai_provider_completion(
+        self, openai_provider, fake_openai_client, chat_response, monkeypatch
+    ):
+        """Test completion method of OpenAI provider."""
+        fake_openai_client.response = chat_response("Test response")
+        monkeypatch.setattr(openai_provider, "client", fake_openai_client)
+
+        result = openai_provider.completion(
+            user_message="Hello",
+            system_prompt="You are helpful",
+            temperature=0.5,
+            max_tokens=100,
+        )
+
+        assert result == "Test response"
+        assert len(fake_openai_client.calls) == 1
+
+    def test_openai_provider_completion_with_images(
+        self,
+        openai_provider,
+        fake_openai_client,
+        chat_response,
+        monkeypatch,
+        jpeg_image,
+    ):
+        """Test completion with image input."""
+        fake_openai_client.response = chat_response("Image description")
+        monkeypatch.setattr(openai_provider, "client", fake_openai_client)
+
+        result = openai_provider.completion(
+            user_message="Describe this image",
+            image_paths=[str(jpeg_image)],
+        )
+
+        assert result == "Image description"
+        # Verify the call included image data
+        messages = fake_openai_client.calls[-1]["messages"]
+        user_content = messages[-1]["content"]
+        assert any(item.get("type") == "image_url" for item in user_content)
+
+    def test_openai_provider_reuses_prepared_images(
+        self, openai_provider, fake_openai_client, chat_response, monkeypatch, tmp_path
+    ):
+        """Repeated requests for the same image should not re-encode it."""
+        test_image = tmp_path / "page.png"
+        Image.effect_noise((400, 200), 64).convert("RGB").save(test_image)
+        fake_openai_client.response = chat_response("Description")
+        monkeypatch.setattr(openai_provider, "client", fake_openai_client)
+
+        with patch("PIL.Image.open", wraps=Image.open) as mock_open:
+            openai_provider.completion("Describe", image_paths=[str(test_image)])
+            openai_provider.completion("Describe", image_paths=[str(test_image)])
+
+            assert mock_open.call_count == 1
+
+    def test_openai_provider_completion_stream(
+        self, openai_provider, fake_openai_client, monkeypatch
+    ):
+        """Test that streamed chunks are concatenated into one response."""
+        fake_openai_client.response = iter(
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=c))])
+            for c in ["Hello", None, ", world"]
+        )
+        monkeypatch.setattr(openai_provider, "client", fake_openai_client)
+
+        result = openai_provider.completion(user_message="Hello", stream=True)
+
+        assert result == "Hello, world"
+        assert fake_openai_client.calls[-1]["stream"] is True
+
+    @patch("openai.AsyncOpenAI")
+    def test_openai_provider_acompletion(
+        self, mock_async_openai_class, chat_response, clean_llm_env
+    ):
+        """Test async completion uses the AsyncOpenAI client."""
+        mock_async_client = MagicMock()
+        mock_response = chat_response("Async response")
+        mock_async_client.chat.completions.create = AsyncMock(
+            return_value=mock_response
+        )
+        mock_async_openai_class.return_value = mock_async_client
+
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        clean_llm_env.setenv("LLM_PROVIDER", "openai")
+
+        provider = OpenAIProvider()
+        result = asyncio.run(provider.acompletion(user_message="Hello"))
+
+        assert result == "Async response"
+        mock_async_client.chat.completions.create.assert_awaited_once()
+
+    @patch("openai.AsyncOpenAI")
+    def test_openai_provider_async_client_per_event_loop(
+        self, mock_async_openai_class, clean_llm_env
+    ):
+        """Each event loop should get its own async client, closed by aclose()."""
+        mock_async_openai_class.side_effect = lambda **kwargs: MagicMock(
+            close=AsyncMock()
+        )
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        provider = OpenAIProvider()
+
+        async def run():
+            client = provider.async_client
+            assert provider.async_client is client
+            await provider.aclose()
+            return client
+
+        first = asyncio.run(run())
+        second = asyncio.run(run())
+
+        assert first is not second
+        first.close.assert_awaited_once()
+        second.close.assert_awaited_once()
+
+    def test_openai_provider_stream_from_env(self, clean_llm_env):
+        """OPENAI_STREAM=1 should enable streaming by default."""
+        clean_llm_env.setenv("OPENAI_API_KEY", "test-key")
+        clean_llm_env.setenv("OPENAI_STREAM", "1")
+
+        provider = OpenAIProvider()
+        assert provider.stream is True
+
+
+@pytest.fixture(scope="module")
+def fake_genai():
+    """Stand-in google-genai SDK modules to install into sys.modules."""
+    google = MagicMock()
+    return {
+        "google": google,
+        "google.genai": google.genai,
+        "google.genai.types": google.genai.types,
+    }
 
 
 class TestGeminiProvider:
     """Tests for the Gemini provider."""
 
-    def test_gemini_provider_missing_package_raises(self):
+    def test_gemini_provider_missing_package_raises(self, monkeypatch):
         """Gemini provider should raise ImportError when google-genai not installed."""
-        with patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"}):
-            with patch.dict("sys.modules", {"google": None, "google.genai": None}):
-                # Force reimport to trigger ImportError
-                import importlib
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        # A None entry in sys.modules makes the import fail even when installed
+        monkeypatch.setitem(sys.modules, "google", None)
+        monkeypatch.setitem(sys.modules, "google.genai", None)
 
-                import core.providers.gemini_provider as gp
+        with pytest.raises(ImportError, match="google-genai"):
+            GeminiProvider()
 
-                # Clear any cached import
-                if "google" in gp.__dict__:
-                    del gp.__dict__["google"]
+    def test_gemini_provider_missing_api_key_raises(self, clean_llm_env, fake_genai):
+        """Gemini provider should raise error when API key is missing."""
+        with patch.dict("sys.modules", fake_genai):
+            with pytest.raises(ValueError, match="API key not found"):
+                GeminiProvider()
 
-                with pytest.raises(ImportError, match="google-genai"):
-                    # Create new instance which triggers import
-                    GeminiProvider()
+    def test_gemini_provider_uses_google_api_key_fallback(
+        self, clean_llm_env, fake_genai
+    ):
+        """Gemini should use GOOGLE_API_KEY as fallback."""
+        clean_llm_env.setenv("GOOGLE_API_KEY", "google-key")
+
+        with patch.dict("sys.modules", fake_genai):
+            provider = GeminiProvider()
+
+        assert provider.api_key == "google-key"
+
+    @staticmethod
+    def _create_mocked_provider(monkeypatch, fake_genai, env):
+        """Create a GeminiProvider backed by the fake google-genai SDK."""
+        fake_genai["google"].reset_mock()
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        with patch.dict("sys.modules", fake_genai):
+            provider = GeminiProvider()
+        return provider, fake_genai["google.genai"].Client.return_value
+
+    def test_gemini_provider_inlines_small_images(
+        self, tmp_path, clean_llm_env, fake_genai
+    ):
+        """Images below the upload threshold should be sent inline."""
+        test_image = tmp_path / "test.jpg"
+        test_image.write_bytes(b"\xff\xd8\xff\xe0test image data")
 
-    def test_gemini_provider_missing_api_key_raises(self):
-        """Gemini provider should raise error when API key is missing."""
-        mock_genai = MagicMock()
-        mock_types = MagicMock()
+        provider, mock_client = self._create_mocked_provider(
+            clean_llm_env, fake_genai, {"GEMINI_API_KEY": "test-key"}
+        )
+        provider.completion("Describe", image_paths=[str(test_image)])
 
-        with patch.dict(os.environ, {}, clear=True):
-            with patch.object(
-                GeminiProvider,
-                "__init__",
-                lambda self: None,
-            ):
-                provider = GeminiProvider.__new__(GeminiProvider)
-                # Manually test the API key validation logic
-                api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-                assert api_key is None
+        mock_client.files.upload.assert_not_called()
+        provider._types.Part.from_bytes.assert_called_once()
 
-    def test_gemini_provider_uses_google_api_key_fallback(self):
-        """Gemini should use GOOGLE_API_KEY as fallback."""
-        mock_genai_module = MagicMock()
-        mock_types_module = MagicMock()
-        mock_client = MagicMock()
-        mock_genai_module.Client.return_value = mock_client
+    def test_gemini_provider_uploads_large_images_once(
+        self, tmp_path, clean_llm_env, fake_genai
+    ):
+        """Images above the upload threshold should be uploaded once and reused."""
+        test_image = tmp_path / "test.jpg"
+        test_image.write_bytes(b"\xff\xd8\xff\xe0test image data")
 
-        with patch.dict(
-            os.environ,
-            {"GOOGLE_API_KEY": "google-key"},
-            clear=True,
-        ):
-            with patch.dict(
-                "sys.modules",
-                {
-                    "google": MagicMock(),
-                    "google.genai": mock_genai_module,
-                    "google.genai.types": mock_types_module,
-                },
-            ):
-                # Patch the import inside __init__
-                with patch(
-                    "builtins.__import__",
-                    side_effect=lambda name, *args: (
-                        mock_genai_module
-                        if "genai" in name
-                        else MagicMock()
-                    ),
-                ):
-                    provider = GeminiProvider.__new__(GeminiProvider)
-                    provider._genai = mock_genai_module
-                    provider._types = mock_types_module
-                    provider.api_key = os.getenv("GEMINI_API_KEY") or os.getenv(
-                        "GOOGLE_API_KEY"
-                    )
-                    assert provider.api_key == "google-key"
+        provider, mock_client = self._create_mocked_provider(
+            clean_llm_env,
+            fake_genai,
+            {"GEMINI_API_KEY": "test-key", "GEMINI_UPLOAD_THRESHOLD": "1"},
+        )
+        provider.completion("Describe", image_paths=[str(test_image)])
+        provider.completion("Describe", image_paths=[str(test_image)])
+
+        mock_client.files.upload.assert_called_once()
+        contents = mock_client.models.generate_content.call_args.kwargs["contents"]
+        assert contents[0] is mock_client.files.upload.return_value
+
+    def test_gemini_provider_reuploads_after_max_size_change(
+        self, tmp_path, clean_llm_env, fake_genai
+    ):
+        """Changing MPD_IMAGE_MAX_SIZE should not reuse an earlier upload."""
+        test_image = tmp_path / "test.jpg"
+        test_image.write_bytes(b"\xff\xd8\xff\xe0test image data")
+
+        provider, mock_client = self._create_mocked_provider(
+            clean_llm_env,
+            fake_genai,
+            {"GEMINI_API_KEY": "test-key", "GEMINI_UPLOAD_THRESHOLD": "1"},
+        )
+        for max_size in ("1000", "2000", "2000"):
+            clean_llm_env.setenv("MPD_IMAGE_MAX_SIZE", max_size)
+            provider.completion("Describe", image_paths=[str(test_image)])
+
+        assert mock_client.files.upload.call_count == 2
+
+    def test_gemini_provider_completion_stream(self, clean_llm_env, fake_genai):
+        """Streamed Gemini chunks should be concatenated into one response."""
+        provider, mock_client = self._create_mocked_provider(
+            clean_llm_env, fake_genai, {"GEMINI_API_KEY": "test-key"}
+        )
+        mock_client.models.generate_content_stream.return_value = iter(
+            SimpleNamespace(text=t) for t in ["Hello", None, ", world"]
+        )
+
+        result = provider.completion("Hello", stream=True)
+
+        assert result == "Hello, world"
+        mock_client.models.generate_content_stream.assert_called_once()
+        mock_client.models.generate_content.assert_not_called()
+
+    def test_gemini_provider_timeout(self, clean_llm_env, fake_genai):
+        """LLM_TIMEOUT should be passed to the client in milliseconds."""
+        provider, _ = self._create_mocked_provider(
+            clean_llm_env,
+            fake_genai,
+            {"GEMINI_API_KEY": "test-key", "LLM_TIMEOUT": "45"},
+        )
+
+        http_options = provider._types.HttpOptions
+        http_options.assert_called_once_with(timeout=45000)
+        client_kwargs = provider._genai.Client.call_args.kwargs
+        assert client_kwargs["http_options"] is http_options.return_value
+
+    def test_gemini_provider_acompletion(self, clean_llm_env, fake_genai, monkeypatch):
+        """Async Gemini completion should use the client's aio interface."""
+        provider, mock_client = self._create_mocked_provider(
+            clean_llm_env, fake_genai, {"GEMINI_API_KEY": "test-key"}
+        )
+        generate = AsyncMock(return_value=SimpleNamespace(text="Async response"))
+        monkeypatch.setattr(mock_client.aio.models, "generate_content", generate)
+
+        result = asyncio.run(provider.acompletion("Hello"))
+
+        assert result == "Async response"
+        generate.assert_awaited_once()
+        mock_client.models.generate_content.assert_not_called()
+
+    def test_gemini_provider_acompletion_stream(
+        self, clean_llm_env, fake_genai, monkeypatch
+    ):
+        """Async Gemini streaming should join the chunks of the aio stream."""
+        provider, mock_client = self._create_mocked_provider(
+            clean_llm_env, fake_genai, {"GEMINI_API_KEY": "test-key"}
+        )
+
+        async def chunks():
+            for text in ["Hello", None, ", world"]:
+                yield SimpleNamespace(text=text)
+
+        generate_stream = AsyncMock(return_value=chunks())
+        monkeypatch.setattr(
+            mock_client.aio.models, "generate_content_stream", generate_stream
+        )
+
+        result = asyncio.run(provider.acompletion("Hello", stream=True))
+
+        assert result == "Hello, world"
+        generate_stream.assert_awaited_once()
+        mock_client.models.generate_content_stream.assert_not_called()
+
+    def test_gemini_provider_async_client_per_event_loop(
+        self, clean_llm_env, fake_genai, monkeypatch
+    ):
+        """Each event loop should get its own async client, closed by aclose()."""
+        provider, _ = self._create_mocked_provider(
+            clean_llm_env, fake_genai, {"GEMINI_API_KEY": "test-key"}
+        )
+        monkeypatch.setattr(
+            provider._genai.Client,
+            "side_effect",
+            lambda **kwargs: MagicMock(aio=MagicMock(aclose=AsyncMock())),
+        )
+
+        async def run():
+            client = provider.async_client
+            assert provider.async_client is client
+            await provider.aclose()
+            return client
+
+        first = asyncio.run(run())
+        second = asyncio.run(run())
+
+        assert first is not second
+        first.aclose.assert_awaited_once()
+        second.aclose.assert_awaited_once()
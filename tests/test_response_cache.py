@@ -0,0 +1,54 @@
+"""Tests for the on-disk LLM response cache."""
+
+from core.ResponseCache import ResponseCache, make_cache_key
+
+
+class TestMakeCacheKey:
+    """Tests for make_cache_key."""
+
+    def test_key_is_deterministic(self):
+        """Same parameters should produce the same key."""
+        assert make_cache_key("openai", "gpt-4o", "prompt") == make_cache_key(
+            "openai", "gpt-4o", "prompt"
+        )
+
+    def test_key_changes_with_parameters(self):
+        """Changing the model or prompt should change the key."""
+        key = make_cache_key("openai", "gpt-4o", "prompt")
+        assert key != make_cache_key("openai", "gpt-4o-mini", "prompt")
+        assert key != make_cache_key("openai", "gpt-4o", "other prompt")
+
+    def test_key_hashes_image_content(self, tmp_path):
+        """Key should depend on image content, not just the path."""
+        image = tmp_path / "page.jpg"
+        image.write_bytes(b"\xff\xd8\xff\xe0first")
+        key1 = make_cache_key("prompt", image_paths=[str(image)])
+
+        image.write_bytes(b"\xff\xd8\xff\xe0second")
+        key2 = make_cache_key("prompt", image_paths=[str(image)])
+
+        assert key1 != key2
+
+
+class TestResponseCache:
+    """Tests for ResponseCache."""
+
+    def test_get_missing_returns_none(self, tmp_path):
+        """Lookup of an unknown key should miss."""
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+        assert cache.get("missing") is None
+
+    def test_set_and_get(self, tmp_path):
+        """Stored responses should be returned on lookup."""
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+        cache.set("key", "# Markdown")
+        assert cache.get("key") == "# Markdown"
+
+    def test_persists_across_instances(self, tmp_path):
+        """Responses should survive reopening the database."""
+        path = str(tmp_path / "nested" / "cache.sqlite")
+        cache = ResponseCache(path)
+        cache.set("key", "# Markdown")
+        cache.close()
+
+        assert ResponseCache(path).get("key") == "# Markdown"
@@ -1,4 +1,7 @@
-from core.Util import remove_markdown_warp
+import os
+from unittest.mock import ANY, MagicMock
+
+from core.Util import prefetch_files, remove_markdown_warp
 
 
 def test_remove_markdown_warp():
@@ -29,3 +32,15 @@ def test_remove_markdown_warp():
         == "print('Hello, world!')"
     )
     assert remove_markdown_warp("```bash\nls -l\n```", "bash") == "ls -l"
+
+
+def test_prefetch_files(tmp_path, monkeypatch):
+    image = tmp_path / "page_0001.jpg"
+    image.write_bytes(b"\xff\xd8\xff\xe0test")
+    fadvise = MagicMock()
+    monkeypatch.setattr(os, "posix_fadvise", fadvise, raising=False)
+    monkeypatch.setattr(os, "POSIX_FADV_WILLNEED", 3, raising=False)
+    # Missing files are skipped without raising
+    prefetch_files([str(image), str(tmp_path / "missing.jpg")])
+    fadvise.assert_called_once_with(ANY, 0, 0, os.POSIX_FADV_WILLNEED)
+    assert image.read_bytes() == b"\xff\xd8\xff\xe0test"